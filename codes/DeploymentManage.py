@@ -1,30 +1,120 @@
 """
 设计一个服务，接受一组营销event，提供一个接口看当前的时间是不是允许部署代码。在营销时间内不是不允许部署代码的。时间前后要留一个固定的时间。
 """
-from datetime import datetime, timedelta
+import bisect
+import calendar
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
 from typing import List
 
+# smallest datetime step, the first deployable instant after a closed blackout [start, end] is end + _TICK
+_TICK = timedelta(microseconds=1)
+
 class MarketingEvent:
     def __init__(self, start_time, end_time, buffer_time_minutes):
         # marketing event with start, end time and buffer
         self.start_time = start_time
         self.end_time = end_time
         self.buffer_time_minutes = buffer_time_minutes
+        # no-deploy window computed once: [start - buffer, end + buffer]
+        self.no_deploy_start = start_time - timedelta(minutes=buffer_time_minutes)
+        self.no_deploy_end = end_time + timedelta(minutes=buffer_time_minutes)
+        self.event_id = None  # set by DeploymentManage, orders events that share the same window
     
     def is_in_no_deploy_window(self, current_time):
-        # calculate no-deploy window: [start - buffer, end + buffer]
-        no_deploy_start = self.start_time - timedelta(minutes=self.buffer_time_minutes)
-        no_deploy_end = self.end_time + timedelta(minutes=self.buffer_time_minutes)
-        
         # check if current time falls within no-deploy window
-        return no_deploy_start <= current_time <= no_deploy_end
+        return self.no_deploy_start <= current_time <= self.no_deploy_end
+
+class RecurringMarketingEvent:
+    PERIODS = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}  # monthly is calendar based
+
+    def __init__(self, start_time, end_time, buffer_time_minutes, frequency, until=None, count=None):
+        # start_time/end_time are the first occurrence, later ones keep its duration
+        # the rule stops after count occurrences or with the last one starting at or before until, whichever is first
+        if frequency not in self.PERIODS and frequency != "monthly":
+            raise ValueError(f"unknown frequency '{frequency}', expected daily, weekly or monthly")
+        self.start_time = start_time
+        self.end_time = end_time
+        self.buffer_time_minutes = buffer_time_minutes
+        self.frequency = frequency
+        self.until = until
+        self.count = count
+        self.buffer = timedelta(minutes=buffer_time_minutes)
+        self.duration = end_time - start_time
+        self.expanded = {}  # occurrence index -> (no_deploy_start, no_deploy_end, event_id) already in the index
+
+    def occurrence_start(self, index):
+        # O1 for every frequency, monthly keeps the day of month and clamps it (jan 31 -> feb 28)
+        if self.frequency != "monthly":
+            return self.start_time + index * self.PERIODS[self.frequency]
+        year, month = divmod(self.start_time.month - 1 + index, 12)
+        year += self.start_time.year
+        day = min(self.start_time.day, calendar.monthrange(year, month + 1)[1])
+        return self.start_time.replace(year=year, month=month + 1, day=day)
+
+    def _exists(self, index):
+        if self.count is not None and index >= self.count:
+            return False
+        return self.until is None or self.occurrence_start(index) <= self.until
+
+    def _first_index_ending_at_or_after(self, t):
+        # first occurrence whose no-deploy window has not ended before t, no walk from the first occurrence
+        first_end = self.end_time + self.buffer
+        if t <= first_end:
+            return 0
+        if self.frequency != "monthly":
+            period = self.PERIODS[self.frequency]
+            return -((first_end - t) // period)  # ceil((t - first_end) / period)
+        # month arithmetic gets within a couple of occurrences, day clamping is at most 3 days off
+        index = max(0, (t.year - first_end.year) * 12 + t.month - first_end.month - 2)
+        while self.occurrence_start(index) + self.duration + self.buffer < t:
+            index += 1
+        return index
+
+    def ends_at_or_after(self, t):
+        # whether some occurrence's no-deploy window is still open at t, False once the rule has run out
+        return self._exists(self._first_index_ending_at_or_after(t))
+
+    def occurrences_between(self, lo, hi):
+        # yield (index, no_deploy_start, no_deploy_end) for every occurrence whose window intersects [lo, hi]
+        index = self._first_index_ending_at_or_after(lo)
+        while self._exists(index):
+            start = self.occurrence_start(index)
+            if start - self.buffer > hi:
+                return
+            yield index, start - self.buffer, start + self.duration + self.buffer
+            index += 1
+
 
 class DeploymentManage:
-    def __init__(self, default_buffer_minutes=30):
+    def __init__(self, default_buffer_minutes=30, expansion_chunk=timedelta(days=30), max_lookahead=timedelta(days=366)):
         # list to store all marketing events
         self.marketing_events = []  # List[MarketingEvent]
         # default buffer time before and after marketing events
         self.default_buffer_minutes = default_buffer_minutes
+
+        # interval index over the no-deploy windows
+        # every event's window, sorted by (start, end, event_id), kept so a removal can re-merge its neighbourhood
+        self.windows = []  # [(no_deploy_start, no_deploy_end, event_id), ...]
+        # windows merged into sorted, disjoint closed intervals, parallel lists so bisect works on the starts
+        self.blocked_starts = []
+        self.blocked_ends = []
+        self.next_event_id = itertools.count()
+
+        # recurring rules are expanded lazily: time is cut into fixed chunks, and the first query that lands in a
+        # chunk adds every rule's occurrences intersecting it to the interval index above, so a multi-year rule
+        # only costs the chunks that are actually queried
+        self.recurring_events = []  # List[RecurringMarketingEvent]
+        self.expansion_chunk = expansion_chunk
+        self.expanded_chunks = set()  # chunk numbers, chunk k covers [epoch + k * chunk, epoch + (k + 1) * chunk)
+        # chunks are counted from the unix epoch, a tz-aware caller gets an aware epoch so the subtraction works
+        self.epoch = datetime(1970, 1, 1)
+        self.aware_epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        # get_next_deploy_window gives up (returns None) on a blackout chain running longer than this while a
+        # recurring rule keeps extending it, a rule like a daily 24h event never ends. one-off events always end
+        self.max_lookahead = max_lookahead
     
     def add_marketing_event(self, start_time, end_time, buffer_minutes=None):
         # use default buffer if not specified
@@ -32,21 +122,103 @@ class DeploymentManage:
         
         # create and add marketing event to list
         event = MarketingEvent(start_time, end_time, buffer)
+        event.event_id = next(self.next_event_id)
         self.marketing_events.append(event)
+
+        # index update: O(log n) to find the overlapping merged intervals, then one slice replacement
+        window = (event.no_deploy_start, event.no_deploy_end, event.event_id)
+        bisect.insort(self.windows, window)
+        self._merge_window(event.no_deploy_start, event.no_deploy_end)
+        return event
+
+    def remove_marketing_event(self, event):
+        # drop the event and re-merge only the merged interval it was part of
+        self.marketing_events.remove(event)  # ValueError if it was never added here
+        self._remove_window((event.no_deploy_start, event.no_deploy_end, event.event_id))
+
+    def add_recurring_event(self, start_time, end_time, frequency, until=None, count=None, buffer_minutes=None):
+        # daily/weekly/monthly rule, nothing is expanded here beyond the chunks earlier queries already touched
+        if until is None and count is None:
+            raise ValueError("recurring event needs an until date or a count")
+        buffer = buffer_minutes if buffer_minutes is not None else self.default_buffer_minutes
+        rule = RecurringMarketingEvent(start_time, end_time, buffer, frequency, until, count)
+        self.recurring_events.append(rule)
+        for chunk in self.expanded_chunks:
+            self._expand_rule(rule, chunk)
+        return rule
+
+    def remove_recurring_event(self, rule):
+        # only the occurrences that were ever expanded are in the index
+        self.recurring_events.remove(rule)
+        for window in rule.expanded.values():
+            self._remove_window(window)
+        rule.expanded.clear()
+
+    def _epoch_for(self, t):
+        return self.epoch if t.tzinfo is None else self.aware_epoch
+
+    def _chunk_of(self, t):
+        return (t - self._epoch_for(t)) // self.expansion_chunk
+
+    def _expand_rule(self, rule, chunk):
+        # add the rule's occurrences intersecting the chunk, one that spans two chunks is only added once
+        lo = self._epoch_for(rule.start_time) + chunk * self.expansion_chunk
+        for index, start, end in rule.occurrences_between(lo, lo + self.expansion_chunk):
+            if index not in rule.expanded:
+                window = (start, end, next(self.next_event_id))
+                rule.expanded[index] = window
+                bisect.insort(self.windows, window)
+                self._merge_window(start, end)
+
+    def _ensure_expanded(self, t):
+        # O1 once t's chunk has been seen, otherwise O(rules + occurrences in the chunk) the first time
+        # nothing to expand without rules, and no chunk is marked so a rule added later still expands it lazily
+        if not self.recurring_events:
+            return
+        chunk = self._chunk_of(t)
+        if chunk not in self.expanded_chunks:
+            self.expanded_chunks.add(chunk)
+            for rule in self.recurring_events:
+                self._expand_rule(rule, chunk)
+
+    def _remove_window(self, window):
+        del self.windows[bisect.bisect_left(self.windows, window)]
+
+        # the merged interval that covered the window, every window inside it starts within [start, end]
+        index = bisect.bisect_right(self.blocked_starts, window[0]) - 1
+        merged_start, merged_end = self.blocked_starts[index], self.blocked_ends[index]
+        lo = bisect.bisect_left(self.windows, merged_start, key=lambda w: w[0])
+        hi = bisect.bisect_right(self.windows, merged_end, key=lambda w: w[0])
+
+        starts, ends = [], []
+        for start, end, _ in self.windows[lo:hi]:  # sorted by start, so one pass merges them
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.blocked_starts[index:index + 1] = starts
+        self.blocked_ends[index:index + 1] = ends
+
+    def _merge_window(self, start, end):
+        # fold [start, end] into the merged intervals, closed windows that only touch are merged too
+        lo = bisect.bisect_left(self.blocked_ends, start)  # first interval ending at or after start
+        hi = bisect.bisect_right(self.blocked_starts, end)  # past the last interval starting at or before end
+        if lo < hi:
+            start = min(start, self.blocked_starts[lo])
+            end = max(end, self.blocked_ends[hi - 1])
+        self.blocked_starts[lo:hi] = [start]
+        self.blocked_ends[lo:hi] = [end]
     
     def can_deploy(self, current_time=None):
         # use current time if not specified
         if current_time is None:
             current_time = datetime.now()
         
-        # iterate through all marketing events
-        for event in self.marketing_events:
-            # if current time is in any no-deploy window, deployment not allowed
-            if event.is_in_no_deploy_window(current_time):
-                return False
-        
-        # no conflicts found, deployment allowed
-        return True
+        # one binary search: the last merged interval starting at or before now, blocked if now is inside it
+        self._ensure_expanded(current_time)
+        index = bisect.bisect_right(self.blocked_starts, current_time) - 1
+        return index < 0 or current_time > self.blocked_ends[index]
     
     def get_next_deploy_window(self, current_time=None):
         # bonus: find when next deployment window opens
@@ -54,15 +226,323 @@ class DeploymentManage:
             current_time = datetime.now()
         
         # if can deploy now, return immediately
-        if self.can_deploy(current_time):
+        self._ensure_expanded(current_time)
+        index = bisect.bisect_right(self.blocked_starts, current_time) - 1
+        if index < 0 or current_time > self.blocked_ends[index]:
             return current_time
         
-        # find earliest end time of conflicting events
-        earliest_end = None
-        for event in self.marketing_events:
-            if event.is_in_no_deploy_window(current_time):
-                event_end = event.end_time + timedelta(minutes=event.buffer_time_minutes)
-                if earliest_end is None or event_end < earliest_end:
-                    earliest_end = event_end
-        
-        return earliest_end
\ No newline at end of file
+        # merged intervals already chain overlapping and touching windows together, so the end of the one we are
+        # in is where the whole blackout ends, not the end of whichever single window happens to finish first
+        # blackouts are closed, so the answer is one tick after that end, an instant can_deploy accepts
+        # a recurring occurrence in a chunk nobody has queried yet can still block that instant, so expand its
+        # chunk and look again until the candidate is free
+        candidate = self.blocked_ends[index] + _TICK
+        while True:
+            if candidate - current_time > self.max_lookahead and any(
+                    rule.ends_at_or_after(candidate) for rule in self.recurring_events):
+                return None
+            self._ensure_expanded(candidate)
+            index = bisect.bisect_right(self.blocked_starts, candidate) - 1
+            if index < 0 or candidate > self.blocked_ends[index]:
+                return candidate
+            candidate = self.blocked_ends[index] + _TICK
+
+    def can_deploy_many(self, times):
+        # can_deploy for a batch, sorted input is answered by one merge walk over the intervals
+        times = list(times)
+        for t in times:
+            self._ensure_expanded(t)
+        starts, ends = self.blocked_starts, self.blocked_ends
+        if any(later < earlier for earlier, later in zip(times, times[1:])):
+            return [self.can_deploy(t) for t in times]
+
+        results = []
+        index = 0  # first interval that has not ended before the current time
+        for t in times:
+            while index < len(ends) and ends[index] < t:
+                index += 1
+            results.append(index == len(starts) or t < starts[index])
+        return results
+
+    def free_windows(self, start, end):
+        # lazily yield closed (free_start, free_end) windows inside [start, end], in time order
+        # every instant of a window is deployable: it starts a tick after a blackout ends and ends a tick before the
+        # next one starts, so can_deploy(free_start) and can_deploy(free_end) are both True
+        # recurring rules are expanded one chunk at a time as the walk reaches it
+        starts, ends = self.blocked_starts, self.blocked_ends
+        cursor = start
+        while cursor <= end:
+            self._ensure_expanded(cursor)
+            index = bisect.bisect_right(starts, cursor) - 1
+            if index >= 0 and cursor <= ends[index]:
+                cursor = ends[index] + _TICK  # cursor is blocked, the next window opens right after this blackout
+                continue
+
+            # free from cursor until just before the next blackout start, which may sit a few chunks further on
+            probe = cursor
+            while True:
+                index = bisect.bisect_right(starts, cursor)
+                if not self.recurring_events:
+                    # no lazy occurrences, the next start in the index is the next blackout
+                    window_end = min(starts[index] - _TICK, end) if index < len(starts) else end
+                    break
+                chunk_end = self._epoch_for(probe) + (self._chunk_of(probe) + 1) * self.expansion_chunk
+                if index < len(starts) and starts[index] < chunk_end:
+                    window_end = min(starts[index] - _TICK, end)
+                    break
+                if chunk_end > end:
+                    window_end = end
+                    break
+                probe = chunk_end
+                self._ensure_expanded(probe)
+
+            yield cursor, window_end
+            cursor = window_end + _TICK
+
+
+class DeploymentCalendarRegistry:
+    def __init__(self, default_buffer_minutes=30):
+        # one interval index per scope, an event lives in exactly one of them and applies to everything below it
+        # global -> region -> service, so a global freeze is stored once and seen by every service
+        self.default_buffer_minutes = default_buffer_minutes
+        self.global_calendar = DeploymentManage(default_buffer_minutes)
+        self.region_calendars = {}  # region -> DeploymentManage
+        self.service_calendars = {}  # service -> DeploymentManage, only services with their own events
+        self.service_regions = {}  # service -> region (None if the service is not in a region)
+        # services without their own calendar, grouped by region, answered by the region check alone
+        self.plain_services = {}  # region -> set of services
+
+    def register_service(self, service, region=None):
+        if service in self.service_regions:
+            raise ValueError(f"service '{service}' is already registered")
+        self.service_regions[service] = region
+        self.plain_services.setdefault(region, set()).add(service)
+
+    def _calendar(self, region=None, service=None):
+        # the calendar owning events of this scope, created on first use
+        if service is not None:
+            if service not in self.service_regions:
+                raise KeyError(f"service '{service}' is not registered")
+            if service not in self.service_calendars:
+                self.service_calendars[service] = DeploymentManage(self.default_buffer_minutes)
+                self.plain_services[self.service_regions[service]].discard(service)
+            return self.service_calendars[service]
+        if region is not None:
+            if region not in self.region_calendars:
+                self.region_calendars[region] = DeploymentManage(self.default_buffer_minutes)
+            return self.region_calendars[region]
+        return self.global_calendar
+
+    def _scopes(self, service):
+        # calendars that apply to a service, widest first
+        calendars = [self.global_calendar]
+        region = self.service_regions[service]
+        if region in self.region_calendars:
+            calendars.append(self.region_calendars[region])
+        if service in self.service_calendars:
+            calendars.append(self.service_calendars[service])
+        return calendars
+
+    def add_marketing_event(self, start_time, end_time, buffer_minutes=None, region=None, service=None):
+        # no region/service: global event
+        return self._calendar(region, service).add_marketing_event(start_time, end_time, buffer_minutes)
+
+    def remove_marketing_event(self, event, region=None, service=None):
+        self._calendar(region, service).remove_marketing_event(event)
+
+    def add_recurring_event(self, start_time, end_time, frequency, until=None, count=None, buffer_minutes=None,
+                            region=None, service=None):
+        return self._calendar(region, service).add_recurring_event(start_time, end_time, frequency, until, count,
+                                                                   buffer_minutes)
+
+    def can_deploy(self, service, current_time=None):
+        if current_time is None:
+            current_time = datetime.now()
+        return all(calendar.can_deploy(current_time) for calendar in self._scopes(service))
+
+    def deployable_services(self, current_time=None):
+        # one pass over the scopes: every calendar is asked once, services without their own events
+        # come in whole per region instead of being checked one by one
+        if current_time is None:
+            current_time = datetime.now()
+        if not self.global_calendar.can_deploy(current_time):
+            return []
+
+        open_regions = {None}
+        for region, calendar in self.region_calendars.items():
+            if calendar.can_deploy(current_time):
+                open_regions.add(region)
+
+        deployable = []
+        for region, services in self.plain_services.items():
+            if region in open_regions or region not in self.region_calendars:
+                deployable.extend(services)
+        for service, calendar in self.service_calendars.items():
+            region = self.service_regions[service]
+            if (region in open_regions or region not in self.region_calendars) and calendar.can_deploy(current_time):
+                deployable.append(service)
+        return deployable
+
+    def get_next_deploy_window(self, service, current_time=None):
+        # the first instant every scope is open: jump to each blocked scope's window end until none moves it
+        if current_time is None:
+            current_time = datetime.now()
+        calendars = self._scopes(service)
+        moved = True
+        while moved:
+            moved = False
+            for calendar in calendars:
+                next_time = calendar.get_next_deploy_window(current_time)
+                if next_time is None:
+                    return None
+                if next_time != current_time:
+                    # open in that scope now, but the jump may land inside another scope's blackout
+                    current_time = next_time
+                    moved = True
+        return current_time
+
+
+def benchmark_can_deploy(num_events=5_000, queries=20_000):
+    # can_deploy against the old scan over every MarketingEvent
+    rng = random.Random(42)
+    base = datetime(2025, 1, 1)
+    manager = DeploymentManage()
+    for _ in range(num_events):
+        start = base + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        manager.add_marketing_event(start, start + timedelta(minutes=rng.randrange(30, 600)))
+    times = [base + timedelta(minutes=rng.randrange(365 * 24 * 60)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    scanned = [not any(event.is_in_no_deploy_window(t) for event in manager.marketing_events) for t in times]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [manager.can_deploy(t) for t in times]
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = manager.can_deploy_many(sorted(times))
+    batch_time = time.perf_counter() - start
+
+    assert scanned == indexed and batched == [manager.can_deploy(t) for t in sorted(times)]
+    print(f"{num_events:,} events, {queries:,} queries: scan {scan_time:.2f}s, interval index {index_time:.3f}s, "
+          f"can_deploy_many (sorted) {batch_time:.3f}s")
+
+    # a year of capacity planning: every free gap, generated lazily
+    start = time.perf_counter()
+    gaps = sum(1 for _ in manager.free_windows(base, base + timedelta(days=365)))
+    print(f"free_windows over a year: {gaps:,} gaps in {time.perf_counter() - start:.3f}s")
+
+
+def benchmark_recurring(num_rules=300, years=10, queries=20_000):
+    # weekly/monthly rules over a long horizon: explode every occurrence up front vs lazy chunk expansion
+    rng = random.Random(7)
+    base = datetime(2025, 1, 1)
+    until = base + timedelta(days=365 * years)
+    rules = []
+    for _ in range(num_rules):
+        start = base + timedelta(minutes=rng.randrange(30 * 24 * 60))
+        rules.append((start, start + timedelta(minutes=rng.randrange(30, 600)), rng.choice(["weekly", "monthly"])))
+    # queries cluster around the next quarter, like deploy checks do
+    times = [base + timedelta(minutes=rng.randrange(90 * 24 * 60)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    exploded = DeploymentManage()
+    for first_start, first_end, frequency in rules:
+        rule = RecurringMarketingEvent(first_start, first_end, exploded.default_buffer_minutes, frequency, until)
+        for index, _, _ in rule.occurrences_between(base, until):
+            occurrence_start = rule.occurrence_start(index)
+            exploded.add_marketing_event(occurrence_start, occurrence_start + rule.duration)
+    exploded_answers = [exploded.can_deploy(t) for t in times]
+    exploded_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lazy = DeploymentManage()
+    for first_start, first_end, frequency in rules:
+        lazy.add_recurring_event(first_start, first_end, frequency, until=until)
+    lazy_answers = [lazy.can_deploy(t) for t in times]
+    lazy_time = time.perf_counter() - start
+
+    assert exploded_answers == lazy_answers
+    print(f"{num_rules} rules over {years} years, {queries:,} queries: "
+          f"explode {len(exploded.windows):,} windows {exploded_time:.2f}s, "
+          f"lazy {len(lazy.windows):,} windows {lazy_time:.3f}s")
+
+
+def benchmark_registry(num_services=500, num_regions=20, global_events=2_000, queries=2_000):
+    # "which services can deploy now": one manager per service with global freezes copied in vs the registry
+    rng = random.Random(11)
+    base = datetime(2025, 1, 1)
+
+    def random_window():
+        start = base + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        return start, start + timedelta(minutes=rng.randrange(30, 600))
+
+    global_windows = [random_window() for _ in range(global_events)]
+    region_windows = {f"region-{r}": [random_window() for _ in range(50)] for r in range(num_regions)}
+    services = {f"service-{s}": f"region-{s % num_regions}" for s in range(num_services)}
+    service_windows = {service: [random_window() for _ in range(5)] for service in list(services)[::10]}
+    times = [base + timedelta(minutes=rng.randrange(365 * 24 * 60)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    managers = {}
+    for service, region in services.items():
+        manager = managers[service] = DeploymentManage()
+        for window in global_windows + region_windows[region] + service_windows.get(service, []):
+            manager.add_marketing_event(*window)
+    copied_events = sum(len(manager.marketing_events) for manager in managers.values())
+    per_service = [sorted(s for s, manager in managers.items() if manager.can_deploy(t)) for t in times]
+    per_service_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    registry = DeploymentCalendarRegistry()
+    for service, region in services.items():
+        registry.register_service(service, region)
+    for window in global_windows:
+        registry.add_marketing_event(*window)
+    for region, windows in region_windows.items():
+        for window in windows:
+            registry.add_marketing_event(*window, region=region)
+    for service, windows in service_windows.items():
+        for window in windows:
+            registry.add_marketing_event(*window, service=service)
+    registry_events = len(registry.global_calendar.marketing_events) + \
+        sum(len(c.marketing_events) for c in registry.region_calendars.values()) + \
+        sum(len(c.marketing_events) for c in registry.service_calendars.values())
+    scoped = [sorted(registry.deployable_services(t)) for t in times]
+    registry_time = time.perf_counter() - start
+
+    assert per_service == scoped
+    print(f"{num_services} services, {queries:,} deployable_services queries: "
+          f"per-service managers {copied_events:,} events {per_service_time:.2f}s, "
+          f"registry {registry_events:,} events {registry_time:.2f}s")
+
+
+if __name__ == "__main__":
+    manager = DeploymentManage(default_buffer_minutes=30)
+    prime_day = manager.add_marketing_event(datetime(2025, 7, 8, 0, 0), datetime(2025, 7, 9, 23, 59))
+    manager.add_marketing_event(datetime(2025, 7, 10, 0, 0), datetime(2025, 7, 10, 12, 0))
+    print(manager.can_deploy(datetime(2025, 7, 10, 0, 5)))  # False, inside the second event's buffer
+    manager.remove_marketing_event(prime_day)
+    print(manager.can_deploy(datetime(2025, 7, 8, 12, 0)))  # True, prime day window is gone
+
+    print(manager.get_next_deploy_window(datetime(2025, 7, 10, 0, 5)))  # 2025-07-10 12:30:00.000001, right after the chained blackout
+    print(list(manager.free_windows(datetime(2025, 7, 9), datetime(2025, 7, 11))))
+
+    # weekly sale every friday 18:00-22:00 through the end of the year, only expanded around the queried weeks
+    manager.add_recurring_event(datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 4, 22, 0), "weekly",
+                                until=datetime(2025, 12, 31))
+    print(manager.can_deploy(datetime(2025, 11, 21, 20, 0)))  # False, friday sale
+    print(manager.get_next_deploy_window(datetime(2025, 11, 21, 20, 0)))  # 2025-11-21 22:30:00.000001
+
+    registry = DeploymentCalendarRegistry()
+    registry.register_service("checkout", region="us-east-1")
+    registry.register_service("search", region="eu-west-1")
+    registry.add_marketing_event(datetime(2025, 11, 28, 0, 0), datetime(2025, 11, 28, 23, 59))  # global freeze
+    registry.add_marketing_event(datetime(2025, 12, 1, 0, 0), datetime(2025, 12, 1, 23, 59), region="us-east-1")
+    print(registry.deployable_services(datetime(2025, 11, 28, 12, 0)))  # [], global freeze
+    print(registry.deployable_services(datetime(2025, 12, 1, 12, 0)))  # ['search']
+
+    benchmark_can_deploy()
+    benchmark_recurring()
+    benchmark_registry()
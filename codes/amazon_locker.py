@@ -11,10 +11,21 @@ give an example of locker
 
 
 
+import contextlib
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
 import uuid
+from array import array
 from enum import Enum
 from collections import deque
 
+from slot_store import DeltaLog, IndexQueue, bulk_new, read_snapshot_file, replay_deltas, write_snapshot_file
+
 class Size(Enum):
     #enumera all size of locker
     SMALL = 0
@@ -62,12 +73,16 @@ class Locker:
         return package
 
 class LockerSystem:
+    SNAPSHOT_MAGIC = b"LOCKSNP1"
+
     def __init__(self, locker_count_by_size):
         # locker_sizes <Size, count>
 
         # only track available lockers and package location is enough
         self.available_lockers = {size: deque() for size in Size} # <Size, deque of locker items> initi each size a deque
         self.package_location = {} # <package_id, locker item> package locker map
+        self.delta_log = None  # DeltaLog once open_delta_log is called, every assign/release is appended
+        self.snapshot_generation = 0
 
         for size, count in locker_count_by_size.items(): 
             for _ in range(count):
@@ -99,6 +114,7 @@ class LockerSystem:
         package = locker.empty_locker()
 
         self.available_lockers[locker.get_size()].append(locker)# append same locker item
+        self._log_release(package_id)
         
         # update all related data in initial state
         del self.package_location[package_id]
@@ -112,18 +128,518 @@ class LockerSystem:
 
         locker = self.available_lockers[size].popleft() # O(1), deque is a double linked list
         locker.assign_package(package) # update locker item.package_inside with a package item
+        self._log_assign(locker, package)
 
         # update related data in initial state
         self.package_location[package.get_id()] = locker
 
         return locker
 
+    def assign_packages(self, batch, all_or_nothing=False):
+        # truck drop-off: place a whole batch at once, returns the locker for each package in batch order (None = not placed)
+        # smallest packages go first into the smallest fitting lockers, which places as many packages as possible
+        # since a locker fits every package up to its size; all_or_nothing places nothing unless everything fits
+        batch = list(batch)
+        plan = self._plan_batch(batch, all_or_nothing)
+        return self._place_batch(batch, self._take_lockers(batch, plan))
+
+    def _take_lockers(self, batch, plan):
+        # pop the planned lockers, logged in pop order so a replay pops the same ones
+        lockers = [None] * len(batch)
+        for position, size in enumerate(plan):
+            if size is not None:
+                lockers[position] = self.available_lockers[size].popleft()
+                self._log_assign(lockers[position], batch[position])
+        return lockers
+
+    def _plan_batch(self, batch, all_or_nothing):
+        # pick a locker size per package without touching any locker, O(n log n) for the sort
+        sizes = list(Size)
+        free = [len(self.available_lockers[size]) for size in sizes]
+        plan = [None] * len(batch)
+        pointer = 0  # smallest size that can still have a free locker, only moves up as packages get bigger
+        for position in sorted(range(len(batch)), key=lambda i: batch[i].get_size().get_num_val()):
+            pointer = max(pointer, batch[position].get_size().get_num_val())
+            while pointer < len(sizes) and not free[pointer]:
+                pointer += 1
+            if pointer == len(sizes):
+                # every later package is at least as big, none of them fits either
+                if all_or_nothing:
+                    return [None] * len(batch)
+                break
+            free[pointer] -= 1
+            plan[position] = sizes[pointer]
+        return plan
+
+    def _place_batch(self, batch, lockers):
+        for package, locker in zip(batch, lockers):
+            if locker is not None:
+                locker.assign_package(package)
+                self.package_location[package.get_id()] = locker
+        return lockers
+
     def get_system_status(self):
         return {
             'available_count': {size: len(queue) for size, queue in self.available_lockers.items()}, # cool way to init a dict
             'occupied_count': len(self.package_location)
         }
 
+    def _log_assign(self, locker, package):
+        if self.delta_log is not None:
+            self.delta_log.log_assign(locker.get_size().get_num_val(), locker.get_id(),
+                                      package.get_id(), package.get_size().get_num_val())
+
+    def _log_release(self, package_id):
+        if self.delta_log is not None:
+            self.delta_log.log_release(package_id)
+
+    def open_delta_log(self, path, reset=False, sync=False):
+        # deltas are relative to the last snapshot, so open this right after save_snapshot / load_snapshot
+        self._swap_delta_log(path, reset, sync)
+
+    def _swap_delta_log(self, path, reset, sync):
+        if self.delta_log is not None:
+            self.delta_log.close()
+        self.delta_log = DeltaLog(path, self.snapshot_generation, reset, sync)
+
+    def save_snapshot(self, path, delta_log_path=None):
+        # full state in one file, the delta log (the open one unless another path is given) restarts empty
+        sync = self.delta_log is not None and self.delta_log.sync
+        free_ids = [[locker.get_id() for locker in self.available_lockers[size]] for size in Size]
+        occupied = [(locker.get_id(), locker.get_size().get_num_val(), package_id,
+                     locker.package_inside.get_size().get_num_val())
+                    for package_id, locker in self.package_location.items()]
+        # time based generation, so a log from some other system's snapshot never matches by accident
+        self.snapshot_generation = max(self.snapshot_generation + 1, time.time_ns())
+        write_snapshot_file(path, self.SNAPSHOT_MAGIC, self.snapshot_generation, free_ids, occupied)
+        if delta_log_path is None and self.delta_log is not None:
+            delta_log_path = self.delta_log.path
+        if delta_log_path is not None:
+            self._swap_delta_log(delta_log_path, True, sync)
+
+    @classmethod
+    def load_snapshot(cls, path, delta_log_path=None, sync=False):
+        # bulk restore: lockers and packages are built from the decoded columns, then the deltas are replayed
+        generation, free_ids, (locker_ids, locker_sizes, package_ids, package_sizes), _ = \
+            read_snapshot_file(path, cls.SNAPSHOT_MAGIC)
+        sizes = list(Size)
+        system = cls({})
+        system.snapshot_generation = generation
+        names = ("locker_size", "locker_id", "package_inside")
+        for size, ids in zip(sizes, free_ids):
+            system.available_lockers[size].extend(
+                bulk_new(Locker, names, itertools.repeat(size), ids, itertools.repeat(None)))
+
+        packages = bulk_new(Package, ("package_size", "package_id"), map(sizes.__getitem__, package_sizes), package_ids)
+        lockers = bulk_new(Locker, names, map(sizes.__getitem__, locker_sizes), locker_ids, packages)
+        system.package_location.update(zip(package_ids, lockers))
+
+        if delta_log_path is not None:
+            def new_package(package_id, size):
+                return bulk_new(Package, ("package_size", "package_id"), [size], [package_id])[0]
+            replay_deltas(DeltaLog.records(delta_log_path, generation), system.available_lockers,
+                          system.package_location, sizes, new_package, Locker.assign_package, Locker.empty_locker)
+            system.open_delta_log(delta_log_path, sync=sync)  # keeps the replayed records, appends after them
+        return system
+
+
+class _StripedDict:
+    # dict split into stripes, each behind its own lock, so threads touching different keys rarely contend
+    # only the operations LockerSystem needs, each one atomic within its stripe
+    def __init__(self, num_stripes=16):
+        self.stripes = [{} for _ in range(num_stripes)]
+        self.locks = [threading.Lock() for _ in range(num_stripes)]
+
+    def _stripe(self, key):
+        return hash(key) % len(self.stripes)
+
+    def __setitem__(self, key, value):
+        index = self._stripe(key)
+        with self.locks[index]:
+            self.stripes[index][key] = value
+
+    def get(self, key, default=None):
+        index = self._stripe(key)
+        with self.locks[index]:
+            return self.stripes[index].get(key, default)
+
+    def pop(self, key, default=None):
+        # check-and-remove in one step, two threads popping the same key never both get the value
+        index = self._stripe(key)
+        with self.locks[index]:
+            return self.stripes[index].pop(key, default)
+
+    def __contains__(self, key):
+        index = self._stripe(key)
+        with self.locks[index]:
+            return key in self.stripes[index]
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self.stripes)
+
+    def update(self, pairs):
+        for key, value in pairs:
+            self[key] = value
+
+    def items(self):
+        # weakly consistent: each stripe is copied under its lock, not all of them at once
+        items = []
+        for index, stripe in enumerate(self.stripes):
+            with self.locks[index]:
+                items.extend(stripe.items())
+        return items
+
+
+class ConcurrentLockerSystem(LockerSystem):
+    def __init__(self, locker_count_by_size, num_stripes=16):
+        super().__init__(locker_count_by_size)
+        # one lock per size class guards that size's free deque, a locker popped under it belongs to one thread only
+        self.size_locks = {size: threading.Lock() for size in Size}
+        self.package_location = _StripedDict(num_stripes)
+
+    def _assign_locker_by_size(self, package, size):
+        with self.size_locks[size]:
+            if not self.available_lockers[size]:
+                return None
+            locker = self.available_lockers[size].popleft()
+            # logged and placed under the size lock, so the log has this size's pops in the order they happened
+            # and a snapshot (which holds every size lock) never sees a locker that is neither free nor occupied
+            self._log_assign(locker, package)
+            locker.assign_package(package)
+            self.package_location[package.get_id()] = locker
+        return locker
+
+    def assign_packages(self, batch, all_or_nothing=False):
+        # plan, take and fill the lockers with every size lock held (Size order, like get_system_status),
+        # so no single assign_package can grab a locker the plan counted on
+        batch = list(batch)
+        with self._all_size_locks():
+            plan = self._plan_batch(batch, all_or_nothing)
+            return self._place_batch(batch, self._take_lockers(batch, plan))
+
+    def get_package(self, package_id):
+        # a locker never changes size, so the lookup can happen before its size lock is taken
+        locker = self.package_location.get(package_id)
+        if locker is None:
+            return None
+        with self.size_locks[locker.get_size()]:
+            # pop is the claim, a second concurrent get_package for the same id gets None
+            if self.package_location.pop(package_id) is None:
+                return None
+            package = locker.empty_locker()
+            self.available_lockers[locker.get_size()].append(locker)
+            self._log_release(package_id)
+        return package
+
+    def open_delta_log(self, path, reset=False, sync=False):
+        # every record is written under a size lock, so holding them all means no worker writes to the old file
+        with self._all_size_locks():
+            super().open_delta_log(path, reset, sync)
+
+    def save_snapshot(self, path, delta_log_path=None):
+        # state capture and log swap as one step: nothing assigned or released in between can be lost,
+        # and nothing lands in the old log after the snapshot that replaces it
+        with self._all_size_locks():
+            super().save_snapshot(path, delta_log_path)
+
+    @contextlib.contextmanager
+    def _all_size_locks(self):
+        # Size order everywhere, so two threads taking all of them never deadlock
+        for size in Size:
+            self.size_locks[size].acquire()
+        try:
+            yield
+        finally:
+            for size in Size:
+                self.size_locks[size].release()
+
+    def get_system_status(self):
+        # all size locks for a consistent free count
+        with self._all_size_locks():
+            available = {size: len(queue) for size, queue in self.available_lockers.items()}
+        return {'available_count': available, 'occupied_count': len(self.package_location)}
+
+
+class _GlobalLockLockerSystem:
+    # what we do today: every call on one LockerSystem behind one lock
+    def __init__(self, locker_count_by_size):
+        self.system = LockerSystem(locker_count_by_size)
+        self.lock = threading.Lock()
+
+    def assign_package(self, package):
+        with self.lock:
+            return self.system.assign_package(package)
+
+    def get_package(self, package_id):
+        with self.lock:
+            return self.system.get_package(package_id)
+
+
+# compact mode: same assign_package / get_package behavior, but no per-locker objects
+# a locker is an index into array columns, ids are plain ints instead of uuid4 strings
+
+_package_ids = itertools.count()
+
+
+class CompactPackage:
+    __slots__ = ("package_size", "package_id")
+
+    def __init__(self, size):
+        self.package_size = size
+        self.package_id = next(_package_ids)  # int id, no uuid4 call or 36 char string
+
+    def get_size(self):
+        return self.package_size
+
+    def get_id(self):
+        return self.package_id
+
+
+class CompactLocker:
+    # lightweight view handed back by assign_package, the state lives in the system's columns
+    __slots__ = ("system", "index")
+
+    def __init__(self, system, index):
+        self.system = system
+        self.index = index
+
+    def get_size(self):
+        return self.system.SIZES[self.system.locker_sizes[self.index]]
+
+    def get_id(self):
+        return self.index
+
+    @property
+    def package_inside(self):
+        return self.system.contents[self.index]
+
+    def assign_package(self, package):
+        self.system.contents[self.index] = package
+
+    def empty_locker(self):
+        package = self.system.contents[self.index]
+        self.system.contents[self.index] = None
+        return package
+
+    def __eq__(self, other):
+        return isinstance(other, CompactLocker) and self.system is other.system and self.index == other.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+
+class CompactLockerSystem:
+    SIZES = tuple(Size)  # size value -> Size
+
+    def __init__(self, locker_count_by_size):
+        # struct of arrays: locker i has size locker_sizes[i] and holds contents[i]
+        # lockers of one size get one contiguous index range, so construction is a few bulk array ops
+        total = sum(locker_count_by_size.values())
+        self.locker_sizes = array("b", bytes(total))
+        self.contents = [None] * total  # package object or None, the occupancy column
+        self.available_lockers = {}  # <Size, IndexQueue of locker indices>
+        self.package_location = {}  # <package_id, locker index>
+
+        start = 0
+        for size in Size:
+            count = locker_count_by_size.get(size, 0)
+            self.locker_sizes[start:start + count] = array("b", [size.get_num_val()]) * count
+            self.available_lockers[size] = IndexQueue(count)
+            self.available_lockers[size].extend_range(start, start + count)
+            start += count
+
+    def assign_package(self, package):
+        # smallest locker that is large enough, same order as LockerSystem
+        for size in self.SIZES[package.get_size().get_num_val():]:
+            queue = self.available_lockers[size]
+            if queue:
+                index = queue.popleft()
+                self.contents[index] = package
+                self.package_location[package.get_id()] = index
+                return CompactLocker(self, index)
+        return None
+
+    def get_package(self, package_id):
+        index = self.package_location.pop(package_id, None)
+        if index is None:
+            return None
+        package = self.contents[index]
+        self.contents[index] = None
+        self.available_lockers[self.SIZES[self.locker_sizes[index]]].append(index)
+        return package
+
+    def get_system_status(self):
+        return {
+            'available_count': {size: len(queue) for size, queue in self.available_lockers.items()},
+            'occupied_count': len(self.package_location)
+        }
+
+
+def benchmark_compact(num_lockers=300_000, num_packages=100_000):
+    # construction time and memory, object-per-locker LockerSystem vs CompactLockerSystem
+    counts = {Size.SMALL: num_lockers // 2, Size.MEDIUM: num_lockers // 3}
+    counts[Size.LARGE] = num_lockers - sum(counts.values())
+
+    for system_class, package_class in ((LockerSystem, Package), (CompactLockerSystem, CompactPackage)):
+        start = time.perf_counter()
+        system = system_class(counts)
+        build_time = time.perf_counter() - start
+
+        tracemalloc.start()
+        system = system_class(counts)
+        build_memory = tracemalloc.get_traced_memory()[0]
+        packages = [package_class(Size.SMALL) for _ in range(num_packages)]
+        for package in packages:
+            system.assign_package(package)
+        full_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        for package in packages:
+            assert system.get_package(package.get_id()) is package
+        assert system.get_system_status()['available_count'] == counts
+        print(f"{system_class.__name__}: {num_lockers:,} lockers built in {build_time:.3f}s, "
+              f"{build_memory / 2**20:.1f} MiB, {full_memory / 2**20:.1f} MiB with {num_packages:,} packages")
+
+
+def check_concurrent_stress(num_threads=8, ops_per_thread=20_000, lockers_per_size=50):
+    # threads assign and retrieve at random, a locker must never hold two packages at once
+    counts = {size: lockers_per_size for size in Size}
+    system = ConcurrentLockerSystem(counts)
+    occupied = {}  # locker id -> package id, checked and set only by the thread that got the locker
+    errors = []
+    barrier = threading.Barrier(num_threads)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        held = []
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            if held and rng.random() < 0.5:
+                package = held.pop(rng.randrange(len(held)))
+                locker = system.package_location.get(package.get_id())
+                if occupied.pop(locker.get_id(), None) != package.get_id():
+                    errors.append(f"locker {locker.get_id()} lost track of its package")
+                if system.get_package(package.get_id()) is not package:
+                    errors.append(f"package {package.get_id()} came back wrong")
+            else:
+                package = Package(rng.choice(list(Size)))
+                locker = system.assign_package(package)
+                if locker is None:
+                    continue
+                if occupied.setdefault(locker.get_id(), package.get_id()) != package.get_id():
+                    errors.append(f"locker {locker.get_id()} assigned twice")
+                held.append(package)
+        for package in held:
+            occupied.pop(system.package_location.get(package.get_id()).get_id(), None)
+            system.get_package(package.get_id())
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors[:5]
+    assert system.get_system_status() == {'available_count': counts, 'occupied_count': 0}
+    lockers = [locker for queue in system.available_lockers.values() for locker in queue]
+    assert len({locker.get_id() for locker in lockers}) == len(lockers) == sum(counts.values())
+    print(f"stress: {num_threads} threads x {ops_per_thread:,} ops, no locker assigned twice")
+
+
+def benchmark_concurrent(ops_per_thread=50_000, thread_counts=(1, 2, 4, 8), lockers_per_size=10_000):
+    # assign/retrieve throughput, one global lock vs per-size locks + striped package map
+    # cpython's gil still serializes the bytecode, the win is less lock convoying, not parallel python
+    counts = {size: lockers_per_size for size in Size}
+    print(f"{'threads':<10}{'global lock ops/s':>20}{'per-size locks ops/s':>22}")
+    for num_threads in thread_counts:
+        row = []
+        for system in (_GlobalLockLockerSystem(counts), ConcurrentLockerSystem(counts)):
+            barrier = threading.Barrier(num_threads + 1)
+
+            def worker(seed):
+                rng = random.Random(seed)
+                packages = [Package(rng.choice(list(Size))) for _ in range(64)]
+                barrier.wait()
+                for op in range(0, ops_per_thread, 2 * len(packages)):
+                    for package in packages:
+                        system.assign_package(package)
+                    for package in packages:
+                        system.get_package(package.get_id())
+
+            threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(num_threads)]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            row.append(num_threads * ops_per_thread / (time.perf_counter() - start))
+        print(f"{num_threads:<10}{row[0]:>20,.0f}{row[1]:>22,.0f}")
+
+
+def benchmark_batch(batch_size=10_000, rounds=10):
+    # truck drop-off: assign_package per package in arrival order vs assign_packages on the whole batch
+    # lockers are a bit short, so arrival order also matters for how many packages get placed
+    rng = random.Random(3)
+    counts = {Size.SMALL: batch_size * 3 // 10, Size.MEDIUM: batch_size * 3 // 10, Size.LARGE: batch_size * 3 // 10}
+    batches = [[Package(rng.choice(list(Size))) for _ in range(batch_size)] for _ in range(rounds)]
+
+    for label in ("assign_package loop", "assign_packages"):
+        system = LockerSystem(counts)
+        placed = 0
+        elapsed = 0.0
+        for batch in batches:
+            start = time.perf_counter()
+            if label == "assign_packages":
+                lockers = system.assign_packages(batch)
+            else:
+                lockers = [system.assign_package(package) for package in batch]
+            elapsed += time.perf_counter() - start
+            placed += sum(locker is not None for locker in lockers)
+            for package, locker in zip(batch, lockers):  # truck leaves, lockers emptied for the next round
+                if locker is not None:
+                    system.get_package(package.get_id())
+        print(f"{label:<22}{rounds * batch_size / elapsed:>12,.0f} packages/s, "
+              f"placed {placed / (rounds * batch_size):.1%}")
+
+
+def benchmark_restore(num_lockers=1_000_000, occupied_fraction=0.3, delta_ops=100_000):
+    # controller restart: replay every event into a fresh LockerSystem vs load the snapshot + delta log
+    rng = random.Random(5)
+    counts = {Size.SMALL: num_lockers // 2, Size.MEDIUM: num_lockers * 3 // 10}
+    counts[Size.LARGE] = num_lockers - sum(counts.values())
+    packages = [Package(rng.choice(list(Size))) for _ in range(int(num_lockers * occupied_fraction))]
+
+    start = time.perf_counter()
+    system = LockerSystem(counts)
+    for package in packages:
+        system.assign_package(package)
+    replay_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, "lockers.snap")
+        log_path = os.path.join(tmp_dir, "lockers.delta")
+        start = time.perf_counter()
+        system.save_snapshot(snapshot_path, log_path)
+        save_time = time.perf_counter() - start
+
+        # traffic after the snapshot, only in the delta log
+        for i in range(delta_ops // 2):
+            system.get_package(packages[i].get_id())
+            system.assign_package(Package(rng.choice(list(Size))))
+        system.delta_log.close()
+
+        start = time.perf_counter()
+        restored = LockerSystem.load_snapshot(snapshot_path, log_path)
+        restore_time = time.perf_counter() - start
+        restored.delta_log.close()
+
+        assert restored.get_system_status() == system.get_system_status()
+        snapshot_size = os.path.getsize(snapshot_path)
+        print(f"{num_lockers:,} lockers, {len(packages):,} packages: replay events {replay_time:.2f}s, "
+              f"save snapshot {save_time:.2f}s ({snapshot_size / 2**20:.0f} MiB), "
+              f"restore snapshot + {delta_ops:,} deltas {restore_time:.2f}s")
+
 
 if __name__ == "__main__":
     locker_count_by_size = {Size.SMALL: 2, Size.MEDIUM: 1, Size.LARGE: 1}
@@ -140,4 +656,23 @@ if __name__ == "__main__":
     # 测试取包裹
     retrieved_package = pickup.get_package(small_package.get_id())
     print(f"Retrieved package: {retrieved_package is not None}")
-    print(f"Final status: {pickup.get_system_status()}")
\ No newline at end of file
+    print(f"Final status: {pickup.get_system_status()}")
+
+    # compact mode，接口和行为一样
+    compact = CompactLockerSystem(locker_count_by_size)
+    small_package = CompactPackage(Size.SMALL)
+    result = compact.assign_package(small_package)
+    print(f"Compact assigned locker ID: {result.get_id()}, size: {result.get_size()}")
+    print(f"Compact retrieved package: {compact.get_package(small_package.get_id()) is small_package}")
+
+    benchmark_compact()
+    # 卡车一次送一批
+    truck = LockerSystem({Size.SMALL: 1, Size.MEDIUM: 1, Size.LARGE: 1})
+    batch = [Package(Size.SMALL), Package(Size.SMALL), Package(Size.LARGE), Package(Size.LARGE)]
+    print([locker.get_size() if locker else None for locker in truck.assign_packages(batch)])
+    print(truck.assign_packages([Package(Size.SMALL), Package(Size.SMALL)], all_or_nothing=True))  # [None, None]
+
+    benchmark_batch()
+    benchmark_restore()
+    check_concurrent_stress()
+    benchmark_concurrent()
\ No newline at end of file
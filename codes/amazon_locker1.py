@@ -18,6 +18,10 @@
 # 中文: 取包裹时，根据ID查映射，回收柜子并放回对应尺寸队列，保证后续可复用。
 # English: On retrieve, I lookup by package ID, push the locker back into its size queue for reuse.
 
+import bisect
+import math
+import random
+import time
 from collections import deque
 from enum import IntEnum
 
@@ -29,38 +33,202 @@ class Size(IntEnum):
     L = 3
     XL = 4
 
+class _NonEmptyIndex:
+    # I keep a 64-ary tree of bitmasks over size classes: bit i of level 0 says class i has a free locker,
+    # bit w of level 1 says word w of level 0 is non-zero, and so on up to a single word
+    # next-set-bit is O(log64 S), three levels already cover 262144 classes
+    def __init__(self, num_classes):
+        self.levels = []
+        words = max(1, -(-num_classes // 64))
+        while True:
+            self.levels.append([0] * words)
+            if words == 1:
+                break
+            words = -(-words // 64)
+
+    def set(self, i):
+        for level in self.levels:
+            word = i >> 6
+            was = level[word]
+            level[word] = was | (1 << (i & 63))
+            if was:
+                break  # the parent bit is already on
+            i = word
+
+    def clear(self, i):
+        for level in self.levels:
+            word = i >> 6
+            level[word] &= ~(1 << (i & 63))
+            if level[word]:
+                break  # the word still has other classes, parent stays on
+            i = word
+
+    def next_at_or_after(self, i):
+        # smallest set index >= i, -1 if none: climb until a word has a bit at or after i, then descend on lowest bits
+        levels = self.levels
+        depth = 0
+        while depth < len(levels):
+            word = i >> 6
+            if word >= len(levels[depth]):
+                return -1
+            bits = levels[depth][word] >> (i & 63)
+            if bits:
+                i += (bits & -bits).bit_length() - 1
+                while depth:
+                    depth -= 1
+                    bits = levels[depth][i]
+                    i = i * 64 + (bits & -bits).bit_length() - 1
+                return i
+            i = word + 1
+            depth += 1
+        return -1
+
+class LockerStation:
+    # one station per object instead of module globals
+    # sizes are either scalars (a Size, a volume, any orderable number) or (w, h, d) dimensions
+    # scalar: smallest fitting class is a bisect plus one next-non-empty lookup, O(log S)
+    # dimensions: classes ordered by volume, a package fits if its sorted dims are each <= the locker's sorted dims
+    # (so rotating is allowed); I start at the first class with enough volume and skip empty classes through the
+    # index, but a class with enough volume and the wrong shape still costs one check
+    def __init__(self, sizes=(), ids=()):
+        self.free_lockers = {}  # size class key -> deque of free locker IDs
+        self.pkg_to_locker = {}  # package ID -> (locker ID, size class key)
+        self.dimensional = None
+        self.keys = []  # sorted size class keys, the position is the class number
+        self.queues = []  # queues[class] is free_lockers[keys[class]]
+        self.non_empty = _NonEmptyIndex(0)
+        self.initLockers(sizes, ids)
+
+    def _key(self, size):
+        # scalar sizes are their own key, dimensions become (volume, smallest, middle, largest)
+        if self.dimensional is None:
+            self.dimensional = isinstance(size, (tuple, list))
+        if not self.dimensional:
+            return size
+        dims = tuple(sorted(size))
+        return (math.prod(dims),) + dims
+
+    def initLockers(self, sizes, ids):
+        # I set up each locker by pushing its ID into the right size queue
+        new_class = False
+        for size, locker_id in zip(sizes, ids):
+            key = self._key(size)
+            if key not in self.free_lockers:
+                self.free_lockers[key] = deque()
+                new_class = True
+            self.free_lockers[key].append(locker_id)
+
+        if new_class:
+            # new size classes shift the class numbers, so rebuild the order and index, O(S) once per init
+            self.keys = sorted(self.free_lockers)
+            self.non_empty = _NonEmptyIndex(len(self.keys))
+            self.class_of = {key: i for i, key in enumerate(self.keys)}
+            self.queues = [self.free_lockers[key] for key in self.keys]
+        for i, queue in enumerate(self.queues):
+            if queue:
+                self.non_empty.set(i)
+
+    def storePackage(self, pkgId, pkgSize):
+        # I find the smallest free locker size that can fit this package
+        key = self._key(pkgSize)
+        if self.dimensional:
+            start = bisect.bisect_left(self.keys, key[:1])  # first class with at least the package's volume
+        else:
+            start = bisect.bisect_left(self.keys, key)
+
+        size_class = self.non_empty.next_at_or_after(start)
+        if self.dimensional:
+            while size_class >= 0 and not all(a <= b for a, b in zip(key[1:], self.keys[size_class][1:])):
+                size_class = self.non_empty.next_at_or_after(size_class + 1)
+        if size_class < 0:
+            raise RuntimeError("No suitable locker")
+
+        queue = self.queues[size_class]
+        lockerId = queue.popleft()
+        if not queue:
+            self.non_empty.clear(size_class)
+        self.pkg_to_locker[pkgId] = (lockerId, self.keys[size_class])
+        return lockerId
+
+    def retrievePackage(self, pkgId):
+        # I look up where the package was stored and give the locker back to its size queue
+        if pkgId not in self.pkg_to_locker:
+            raise RuntimeError("Unknown package")
+        lockerId, key = self.pkg_to_locker.pop(pkgId)
+        size_class = self.class_of[key]
+        if not self.queues[size_class]:
+            self.non_empty.set(size_class)
+        self.queues[size_class].append(lockerId)
+        return lockerId
+
+# the module-level API works on one default station, like before
+_default_station = LockerStation()
 # I map each size to a queue of free locker IDs
-freeLockers = dict()
+freeLockers = _default_station.free_lockers
 # I map each package ID to its assigned locker ID
-pkgToLocker = dict()
+pkgToLocker = _default_station.pkg_to_locker
 
 def initLockers(sizes, ids):
-    # I set up each locker by pushing its ID into the right size queue
-    for size, locker_id in zip(sizes, ids):
-        if size not in freeLockers:
-            freeLockers[size] = deque()
-        freeLockers[size].append(locker_id)
+    _default_station.initLockers(sizes, ids)
 
 def storePackage(pkgId, pkgSize):
-    # I find the first locker size that can fit this package
-    for size in sorted(freeLockers.keys()):
-        if size >= pkgSize and freeLockers[size]:
-            lockerId = freeLockers[size].popleft()
-            pkgToLocker[pkgId] = (lockerId, size)
-            if not freeLockers[size]:
-                del freeLockers[size]
-            return lockerId
-    raise RuntimeError("No suitable locker")
+    return _default_station.storePackage(pkgId, pkgSize)
 
 def retrievePackage(pkgId):
-    # I look up where the package was stored
-    if pkgId not in pkgToLocker:
-        raise RuntimeError("Unknown package")
-    lockerId, size = pkgToLocker[pkgId]
-    del pkgToLocker[pkgId]
-    if size not in freeLockers:
-        freeLockers[size] = deque()
-    freeLockers[size].append(lockerId)
+    _default_station.retrievePackage(pkgId)
+
+class _SortedScanStation:
+    # the old storePackage, re-sorting the size keys on every call, kept for the benchmark
+    def __init__(self, sizes, ids):
+        self.free_lockers = {}
+        self.pkg_to_locker = {}
+        for size, locker_id in zip(sizes, ids):
+            self.free_lockers.setdefault(size, deque()).append(locker_id)
+
+    def storePackage(self, pkgId, pkgSize):
+        for size in sorted(self.free_lockers.keys()):
+            if size >= pkgSize and self.free_lockers[size]:
+                lockerId = self.free_lockers[size].popleft()
+                self.pkg_to_locker[pkgId] = (lockerId, size)
+                if not self.free_lockers[size]:
+                    del self.free_lockers[size]
+                return lockerId
+        raise RuntimeError("No suitable locker")
+
+    def retrievePackage(self, pkgId):
+        lockerId, size = self.pkg_to_locker.pop(pkgId)
+        self.free_lockers.setdefault(size, deque()).append(lockerId)
+
+def benchmark_station(class_counts=(1_000, 10_000, 100_000), lockers_per_class=2, ops=2_000):
+    # store/retrieve ops per second, sorted-key scan vs LockerStation, with S distinct size classes
+    print(f"{'classes':>10}{'sorted scan ops/s':>20}{'LockerStation ops/s':>22}")
+    for num_classes in class_counts:
+        rng = random.Random(num_classes)
+        sizes = [size for size in range(num_classes) for _ in range(lockers_per_class)]
+        ids = list(range(len(sizes)))
+        package_sizes = [rng.randrange(num_classes) for _ in range(ops)]
+
+        row = []
+        for station_class in (_SortedScanStation, LockerStation):
+            station = station_class(sizes, ids)
+            stored = deque()
+            count = ops if station_class is LockerStation else max(20, ops * 1_000 // num_classes)
+            assigned = []
+            start = time.perf_counter()
+            for i in range(count):
+                try:
+                    assigned.append(station.storePackage(i, package_sizes[i % ops]))
+                    stored.append(i)
+                except RuntimeError:
+                    assigned.append(None)
+                if len(stored) > len(sizes) // 2:  # keep the station about half full
+                    station.retrievePackage(stored.popleft())
+            row.append(2 * count / (time.perf_counter() - start))
+            if station_class is _SortedScanStation:
+                baseline = assigned
+            else:
+                assert assigned[:len(baseline)] == baseline  # same lockers, same order
+        print(f"{num_classes:>10,}{row[0]:>20,.0f}{row[1]:>22,.0f}")
 
 if __name__ == "__main__":
     # I list all locker sizes and their IDs
@@ -74,6 +242,13 @@ if __name__ == "__main__":
     print(retrievePackage("A123"))           # I retrieve package A123 and free the locker
     print(idA, idB)
 
+    # a station of its own, with real dimensions: the package fits the 30x20x10 locker turned on its side
+    station = LockerStation([(40, 40, 40), (10, 20, 30), (5, 5, 50)], ["big", "box", "tube"])
+    print(station.storePackage("C789", (25, 8, 15)))  # box
+    print(station.storePackage("D012", (2, 2, 45)))  # tube, smaller volume than big
+
+    benchmark_station()
+
 # # initLockers runs in O(N) time, where N is the number of lockers, because it loops once over all lockers
 # # storePackage does a map.lower_bound in O(log S) time (S=size categories, constant 5) plus O(1) queue and hash insert on average
 # # storePackage worst-case can incur O(P) time if the hash map degrades, where P is number of stored packages
@@ -84,3 +259,4 @@ if __name__ == "__main__":
 # A nicer approach is to store both the lockerId and the Size in our map, so retrieval can look up everything it needs.
 # define a mapping from package ID to (locker ID, size)
 # unordered_map<string, pair<int,Size>> pkgToLocker;
+# LockerStation replaces the sorted() scan: storePackage is a bisect plus an O(log64 S) next-non-empty-class lookup
@@ -0,0 +1,455 @@
+"""
+TimeTravelHashMap that survives restarts without replaying every write through put()
+
+- writes append a crc'd record to the active log (wal-N.log) and go into the in-memory map
+- once the log passes segment_bytes it is sealed: the in-memory versions are written as a sorted,
+  indexed segment file (seg-N-N.sst), fsync'd and renamed into place, then the log is dropped
+- startup mmaps the sealed segments and loads only their sparse index (every index_interval-th record),
+  then replays the one unsealed log; a torn tail record from a crash is detected by its crc and truncated
+- get / history / latest / count read straight from the mmap'd segments, merged with the in-memory versions
+- compact_segments() merges all segments into one (seg-FIRST-LAST.sst covers the merged sequence range)
+
+equal timestamps keep TimeTravelHashMap's rule: get() returns the first written of them
+retention policies only ever applied to the in-memory map, so they are not offered here
+
+"""
+import bisect
+import heapq
+import itertools
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from array import array
+from collections.abc import Mapping
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from time_travel_hash import TimeTravelHashMap
+
+
+_LOG_RECORD = struct.Struct("<IHIq")  # crc32 of the rest, key_len, value_len, timestamp
+_CRC = struct.Struct("<I")
+_SEG_RECORD = struct.Struct("<HIq")  # key_len, value_len, timestamp
+_INDEX_ENTRY = struct.Struct("<HqQ")  # key_len, timestamp, record offset
+_FOOTER = struct.Struct("<QQQ8s")  # index offset, index entries, records, magic
+_SEG_MAGIC = b"TTSEG001"
+_MIN_TIMESTAMP = -(1 << 63)
+_MAX_TIMESTAMP = (1 << 63) - 1
+
+
+def _write_segment(path: str, records: Iterable[Tuple[bytes, int, bytes]], index_interval: int) -> None:
+    # records must come sorted by (key, timestamp), written to a side file then renamed so the segment is all or nothing
+    tmp_path = path + ".tmp"
+    index = []
+    offset = 0
+    count = 0
+    with open(tmp_path, "wb") as f:
+        for key, timestamp, value in records:
+            if count % index_interval == 0:
+                index.append((key, timestamp, offset))
+            record = _SEG_RECORD.pack(len(key), len(value), timestamp) + key + value
+            f.write(record)
+            offset += len(record)
+            count += 1
+
+        for key, timestamp, record_offset in index:
+            f.write(_INDEX_ENTRY.pack(len(key), timestamp, record_offset) + key)
+        f.write(_FOOTER.pack(offset, len(index), count, _SEG_MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Segment:
+    # one sealed, immutable segment: records sorted by (key bytes, timestamp) + sparse index + footer
+    def __init__(self, path: str, first_seq: int, last_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index_offset, index_count, self.record_count, magic = _FOOTER.unpack_from(self.mm, len(self.mm) - _FOOTER.size)
+        if magic != _SEG_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a segment file")
+        self.data_end = index_offset
+
+        # only the sparse index is read into memory, the records stay in the page cache
+        self.index_keys: List[Tuple[bytes, int]] = []
+        self.index_offsets = array('Q')
+        position = index_offset
+        for _ in range(index_count):
+            key_len, timestamp, record_offset = _INDEX_ENTRY.unpack_from(self.mm, position)
+            position += _INDEX_ENTRY.size
+            self.index_keys.append((self.mm[position:position + key_len], timestamp))
+            self.index_offsets.append(record_offset)
+            position += key_len
+
+        # index entry i sits on record i * index_interval, counted from the first block only (it stops at the
+        # second index entry), so ranks need no footer change and opening never reads the rest of the records
+        self.index_interval = self.record_count
+        if index_count > 1:
+            first_block = itertools.takewhile(lambda record: record[2] < self.index_offsets[1], self._records_from(0))
+            self.index_interval = sum(1 for _ in first_block)
+
+    def _records_from(self, offset: int) -> Iterator[Tuple[bytes, int, int, int]]:
+        # (key, timestamp, value offset, value length) from offset to the end of the data section
+        mm = self.mm
+        unpack_from = _SEG_RECORD.unpack_from
+        data_end = self.data_end
+        while offset < data_end:
+            key_len, value_len, timestamp = unpack_from(mm, offset)
+            key_start = offset + _SEG_RECORD.size
+            value_start = key_start + key_len
+            yield mm[key_start:value_start], timestamp, value_start, value_len
+            offset = value_start + value_len
+
+    def _block_start(self, index_position: int) -> int:
+        # record offset of the index block just before index_position
+        return self.index_offsets[index_position - 1] if index_position else 0
+
+    def _value(self, value_start: int, value_len: int) -> Any:
+        return pickle.loads(self.mm[value_start:value_start + value_len])
+
+    def floor(self, key: bytes, timestamp: int) -> Optional[Tuple[int, Any]]:
+        # newest (timestamp, value) of key at or before timestamp, scans at most one index block
+        start = self._block_start(bisect.bisect_right(self.index_keys, (key, timestamp)))
+        found = None
+        for record_key, record_ts, value_start, value_len in self._records_from(start):
+            if record_key > key or (record_key == key and record_ts > timestamp):
+                break
+            if record_key == key:
+                # keep the last match: among equal timestamps that is the first written, see module doc
+                found = (record_ts, value_start, value_len)
+        if found is None:
+            return None
+        return found[0], self._value(found[1], found[2])
+
+    def history(self, key: bytes, start: int, end: int) -> Iterator[Tuple[int, Any]]:
+        # lazy (timestamp, value) pairs of key with start <= timestamp <= end, read straight from the mapping
+        offset = self._block_start(bisect.bisect_left(self.index_keys, (key, start)))
+        for record_key, record_ts, value_start, value_len in self._records_from(offset):
+            if record_key < key or (record_key == key and record_ts < start):
+                continue
+            if record_key != key or record_ts > end:
+                return
+            yield record_ts, self._value(value_start, value_len)
+
+    def _rank(self, key: bytes, timestamp: int) -> int:
+        # number of records <= (key, timestamp): index block start + one block of record headers, no values read
+        position = bisect.bisect_right(self.index_keys, (key, timestamp))
+        if not position:
+            return 0
+        rank = (position - 1) * self.index_interval
+        for record_key, record_ts, _, _ in self._records_from(self.index_offsets[position - 1]):
+            if record_key > key or (record_key == key and record_ts > timestamp):
+                break
+            rank += 1
+        return rank
+
+    def count(self, key: bytes, start: int, end: int) -> int:
+        # versions of key with start <= timestamp <= end, timestamps are ints so "< start" is "<= start - 1"
+        if start > end:
+            return 0
+        return self._rank(key, end) - self._rank(key, start - 1)
+
+    def raw_records(self) -> Iterator[Tuple[bytes, int, bytes]]:
+        # every (key, timestamp, pickled value) in file order, used by compaction
+        for record_key, record_ts, value_start, value_len in self._records_from(0):
+            yield record_key, record_ts, self.mm[value_start:value_start + value_len]
+
+    def keys(self) -> Iterator[bytes]:
+        previous = None
+        for record_key, _, _, _ in self._records_from(0):
+            if record_key != previous:
+                previous = record_key
+                yield record_key
+
+    def close(self) -> None:
+        self.mm.close()
+        self.file.close()
+
+
+class _DurableSnapshotView(Mapping):
+    # read-only view of a DurableTimeTravelHashMap as of one timestamp, memory and segments merged per lookup
+    def __init__(self, time_map: "DurableTimeTravelHashMap", timestamp: int):
+        self._map = time_map
+        self._timestamp = timestamp
+
+    def __getitem__(self, key: str) -> Any:
+        found = self._map._floor(key, self._timestamp)
+        if found is None:
+            raise KeyError(key)
+        return found[1]
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self._map.keys() if self._map._floor(key, self._timestamp) is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class DurableTimeTravelHashMap(TimeTravelHashMap):
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, index_interval: int = 64,
+                 sync: bool = False):
+        # sync=False flushes every write to the os (survives a process crash), sync=True also fsyncs it (power loss)
+        # self.data only holds the versions written since the last seal, older ones live in self.segments
+        super().__init__()
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.sync = sync
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments: List[_Segment] = []  # oldest first
+        self._load_segments()
+        self.log_seq = max((segment.last_seq for segment in self.segments), default=0) + 1
+        self._recover_log()
+        self.log = open(self._log_path(self.log_seq), "ab")
+        self.log_size = self.log.tell()
+
+    def _log_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"wal-{seq:08d}.log")
+
+    def _segment_path(self, first_seq: int, last_seq: int) -> str:
+        return os.path.join(self.directory, f"seg-{first_seq:08d}-{last_seq:08d}.sst")
+
+    def _load_segments(self) -> None:
+        # map every sealed segment, a segment whose range sits inside a wider one is a leftover
+        # of a compaction that crashed before deleting its inputs
+        ranges = []
+        for name in os.listdir(self.directory):
+            if name.startswith("seg-") and name.endswith(".sst"):
+                first_seq, last_seq = (int(part) for part in name[4:-4].split("-"))
+                ranges.append((first_seq, last_seq))
+            elif name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))  # half-written segment, its source still exists
+
+        ranges.sort(key=lambda r: (r[0], -r[1]))
+        covered_until = 0
+        for first_seq, last_seq in ranges:
+            if last_seq <= covered_until:
+                os.remove(self._segment_path(first_seq, last_seq))
+                continue
+            self.segments.append(_Segment(self._segment_path(first_seq, last_seq), first_seq, last_seq))
+            covered_until = last_seq
+
+    def _recover_log(self) -> None:
+        # replay unsealed logs into memory; a log whose segment already exists was sealed right before a crash
+        sealed_until = max((segment.last_seq for segment in self.segments), default=0)
+        log_seqs = sorted(int(name[4:-4]) for name in os.listdir(self.directory)
+                          if name.startswith("wal-") and name.endswith(".log"))
+        for seq in log_seqs:
+            if seq <= sealed_until:
+                os.remove(self._log_path(seq))
+                continue
+            self._replay_log(self._log_path(seq))
+            self.log_seq = seq
+
+    def _replay_log(self, path: str) -> None:
+        with open(path, "rb") as f:
+            buffer = f.read()
+
+        position = 0
+        header_size = _LOG_RECORD.size
+        while position + header_size <= len(buffer):
+            crc, key_len, value_len, timestamp = _LOG_RECORD.unpack_from(buffer, position)
+            end = position + header_size + key_len + value_len
+            if end > len(buffer) or zlib.crc32(buffer[position + 4:end]) != crc:
+                break  # torn or corrupt tail, everything after it is dropped
+            key_start = position + header_size
+            key = buffer[key_start:key_start + key_len].decode()
+            value = pickle.loads(buffer[key_start + key_len:end])
+            super().put(key, value, timestamp)
+            position = end
+
+        if position < len(buffer):
+            with open(path, "r+b") as f:
+                f.truncate(position)
+
+    def put(self, key: str, value: Any, timestamp: Optional[int] = None) -> None:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        # log first, the write only counts once it is durable
+        key_bytes = key.encode()
+        value_bytes = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        body = _SEG_RECORD.pack(len(key_bytes), len(value_bytes), timestamp) + key_bytes + value_bytes
+        self.log.write(_CRC.pack(zlib.crc32(body)) + body)
+        self.log.flush()
+        if self.sync:
+            os.fsync(self.log.fileno())
+        self.log_size += 4 + len(body)
+
+        super().put(key, value, timestamp)
+        if self.log_size >= self.segment_bytes:
+            self.seal()
+
+    def seal(self) -> None:
+        # write the in-memory versions as a sorted segment, then start a fresh log
+        if self.data:
+            records = []
+            for key_bytes, key in sorted((key.encode(), key) for key in self.data):
+                timestamps, values = self.data[key]
+                for timestamp, value in zip(timestamps, values):
+                    records.append((key_bytes, timestamp, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+            path = self._segment_path(self.log_seq, self.log_seq)
+            _write_segment(path, records, self.index_interval)
+            self.segments.append(_Segment(path, self.log_seq, self.log_seq))
+
+        # once the segment is renamed into place the log is redundant, a crash here just deletes it on startup
+        self.log.close()
+        os.remove(self._log_path(self.log_seq))
+        self.data = {}
+        self.log_seq += 1
+        self.log = open(self._log_path(self.log_seq), "ab")
+        self.log_size = 0
+
+    def compact_segments(self) -> None:
+        # k-way merge of every segment into one covering their whole sequence range
+        if len(self.segments) < 2:
+            return
+
+        # newest segment first, so among equal (key, timestamp) the newer record comes first and the
+        # floor scan (which keeps the last match) still returns the first written one
+        merged = heapq.merge(*(segment.raw_records() for segment in reversed(self.segments)),
+                             key=lambda record: (record[0], record[1]))
+        path = self._segment_path(self.segments[0].first_seq, self.segments[-1].last_seq)
+        _write_segment(path, merged, self.index_interval)
+
+        old_segments = self.segments
+        self.segments = [_Segment(path, old_segments[0].first_seq, old_segments[-1].last_seq)]
+        for segment in old_segments:
+            segment.close()
+            os.remove(segment.path)
+
+    def _floor(self, key: str, timestamp: int) -> Optional[Tuple[int, Any]]:
+        # newest (timestamp, value) at or before timestamp across memory and segments
+        # sources are checked newest first and a tie goes to the older source, matching get() on the plain map
+        found = None
+        if key in self.data:
+            timestamps, values = self.data[key]
+            insert_pos = bisect.bisect_right(timestamps, timestamp)
+            if insert_pos:
+                found = (timestamps[insert_pos - 1], values[insert_pos - 1])
+
+        key_bytes = key.encode()
+        for segment in reversed(self.segments):
+            candidate = segment.floor(key_bytes, timestamp)
+            if candidate is not None and (found is None or candidate[0] >= found[0]):
+                found = candidate
+        return found
+
+    def get(self, key: str, timestamp: int) -> Optional[Any]:
+        found = self._floor(key, timestamp)
+        return None if found is None else found[1]
+
+    def get_many(self, keys: Iterable[str], timestamp: int) -> List[Optional[Any]]:
+        return [self.get(key, timestamp) for key in keys]
+
+    def snapshot(self, timestamp: int) -> Mapping:
+        return _DurableSnapshotView(self, timestamp)
+
+    def keys(self) -> Iterator[str]:
+        # every key that has a version in memory or on disk
+        seen = set(self.data)
+        yield from self.data
+        for segment in self.segments:
+            for key_bytes in segment.keys():
+                key = key_bytes.decode()
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def history(self, key: str, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Tuple[int, Any]]:
+        # lazy merge by timestamp of the in-memory versions and every segment's range, nothing is copied
+        start = _MIN_TIMESTAMP if start is None else start
+        end = _MAX_TIMESTAMP if end is None else end
+        key_bytes = key.encode()
+        sources = [super().history(key, start, end)]
+        sources.extend(segment.history(key_bytes, start, end) for segment in reversed(self.segments))
+        return heapq.merge(*sources, key=lambda version: version[0])
+
+    def latest(self, key: str) -> Optional[Tuple[int, Any]]:
+        return self._floor(key, _MAX_TIMESTAMP)
+
+    def count(self, key: str, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        # bisects on the in-memory part, index ranks on every segment, no value is unpickled
+        start = _MIN_TIMESTAMP if start is None else start
+        end = _MAX_TIMESTAMP if end is None else end
+        key_bytes = key.encode()
+        return super().count(key, start, end) + sum(segment.count(key_bytes, start, end) for segment in self.segments)
+
+    def close(self) -> None:
+        self.log.close()
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def check_truncated_tail_recovery() -> None:
+    # crash mid-write: chop bytes off the last log record, reopen, every earlier write must still be there
+    directory = tempfile.mkdtemp()
+    try:
+        with DurableTimeTravelHashMap(directory, segment_bytes=2_000) as time_map:
+            for i in range(100):
+                time_map.put(f"key-{i % 7}", {"version": i}, i)
+            log_path = time_map._log_path(time_map.log_seq)
+            sealed = len(time_map.segments)
+
+        with open(log_path, "r+b") as f:
+            f.truncate(os.path.getsize(log_path) - 3)
+
+        with DurableTimeTravelHashMap(directory, segment_bytes=2_000) as time_map:
+            assert len(time_map.segments) == sealed
+            assert time_map.get("key-1", 98) == {"version": 92}
+            assert time_map.latest("key-1") == (92, {"version": 92})  # the torn version 99 write for key-1 is gone
+            assert time_map.get("key-0", 98) == {"version": 98}
+            assert [t for t, _ in time_map.history("key-0")] == list(range(0, 99, 7))
+            time_map.put("key-1", "after recovery", 200)  # the truncated log is appendable again
+
+        with DurableTimeTravelHashMap(directory, segment_bytes=2_000) as time_map:
+            assert time_map.get("key-1", 200) == "after recovery"
+            time_map.compact_segments()
+            assert [t for t, _ in time_map.history("key-0")] == list(range(0, 99, 7))
+    finally:
+        shutil.rmtree(directory)
+    print("truncated tail recovery ok")
+
+
+def benchmark_cold_start(sizes=(100_000, 1_000_000), num_keys=1_000):
+    # reopen time vs data size: replaying one big log vs mapping sealed segments + sparse index
+    print(f"{'versions':>10}{'log replay s':>14}{'segments s':>12}")
+    for n in sizes:
+        row = []
+        for seal in (False, True):
+            directory = tempfile.mkdtemp()
+            try:
+                with DurableTimeTravelHashMap(directory, segment_bytes=1 << 62) as time_map:
+                    for i in range(n):
+                        time_map.put(f"key-{i % num_keys}", i, i)
+                    if seal:
+                        time_map.seal()
+
+                start = time.perf_counter()
+                with DurableTimeTravelHashMap(directory) as time_map:
+                    time_map.get("key-1", n)  # first read is part of being ready
+                    row.append(time.perf_counter() - start)
+            finally:
+                shutil.rmtree(directory)
+        print(f"{n:>10,}{row[0]:>14.3f}{row[1]:>12.3f}")
+
+
+if __name__ == "__main__":
+    check_truncated_tail_recovery()
+    benchmark_cold_start()
@@ -1,88 +1,762 @@
 """
-design a hashtable 
+design a hashtable
 suport operations like put get remove
 
+two engines, picked at construction:
+- chaining (default): list of buckets, each bucket is a list of (key, value) tuples
+- open_addressing: linear probing over flat parallel key/value/hash arrays with tombstones,
+  no per-entry tuple and no per-bucket list, so much less memory and fewer pointer hops
+
+chaining also has an incremental resize mode (incremental_resize=True): on growth the old and new
+bucket arrays live side by side and every put/get/remove migrates a few old buckets, so no single
+op pays the O(n) rehash
+
 """
+import gc
+import threading
+import time
+import tracemalloc
+from array import array
+
+
+ENGINES = ("chaining", "open_addressing")
 
 
 class HashTable:
-    def __init__(self, initial_capacity=16):
-        # initialize bucket array with empty lists for chaining collision resolution
+    def __new__(cls, initial_capacity=16, engine="chaining", **kwargs):
+        # engine is picked at construction, HashTable(engine="open_addressing") gives the array-backed table
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        if cls is HashTable and engine == "open_addressing":
+            return super().__new__(OpenAddressingHashTable)
+        return super().__new__(cls)
+
+    def __init__(self, initial_capacity=16, engine="chaining", incremental_resize=False, rehash_step=4):
+        # initialize bucket array for chaining collision resolution
+        # empty buckets are None and get a list on first insert, so allocating a big table is one flat list
         self.capacity = initial_capacity
         self.size = 0
-        self.buckets = [[] for _ in range(self.capacity)]  # list of lists, each bucket is a list of (key, value) tuples
+        self.buckets = [None] * self.capacity  # each bucket is None or a list of (key, value) tuples
         self.load_factor_threshold = 0.75  # resize trigger threshold
-    
+
+        # incremental resize: old and new tables live side by side, every op migrates a few old buckets
+        # rehash_step=4 guarantees the old table is drained before the new one hits its own threshold
+        self.incremental_resize = incremental_resize
+        self.rehash_step = rehash_step
+        self.old_buckets = None  # old table while a resize is in progress, None otherwise
+        self.old_capacity = 0
+        self.rehash_index = 0  # old buckets below this index are already migrated
+
     def _hash_function(self, key):
         # simple modulo hash function to map key to bucket index
         return hash(key) % self.capacity  # hash() is built-in python hash function
-    
-    def _resize(self):
-        # double capacity when load factor exceeds threshold
+
+    def _locate(self, key):
+        # return (table, index) of the bucket that owns key
+        # during a resize a key lives in the old table iff its old bucket is not migrated yet
+        if self.old_buckets is not None:
+            old_index = hash(key) % self.old_capacity
+            if old_index >= self.rehash_index:
+                return self.old_buckets, old_index
+        return self.buckets, self._hash_function(key)
+
+    def _resize(self, new_capacity=None):
+        # double capacity when load factor exceeds threshold, or jump straight to new_capacity when presizing
+        if self.old_buckets is not None:
+            self._finish_rehash()  # table outgrew itself mid-resize, only possible with a tiny rehash_step
+
         old_buckets = self.buckets
-        self.capacity *= 2
-        self.size = 0
-        self.buckets = [[] for _ in range(self.capacity)]  # create new larger bucket array
-        
-        # rehash all existing key-value pairs into new buckets
+        old_capacity = self.capacity
+        self.capacity = new_capacity or self.capacity * 2
+        self.buckets = [None] * self.capacity  # create new larger bucket array
+
+        if self.incremental_resize and new_capacity is None:
+            # just swap tables, buckets move over a few at a time in _rehash_step
+            self.old_buckets = old_buckets
+            self.old_capacity = old_capacity
+            self.rehash_index = 0
+            return
+
+        # rehash all existing key-value pairs straight into new buckets
+        # no put() here: keys are already unique and the load factor cannot trip again
+        new_buckets = self.buckets
+        capacity = self.capacity
         for bucket in old_buckets:
-            for key, value in bucket:
-                self.put(key, value)  # reinsert using new hash function
-    
+            if bucket:
+                for entry in bucket:
+                    index = hash(entry[0]) % capacity
+                    if new_buckets[index] is None:
+                        new_buckets[index] = [entry]
+                    else:
+                        new_buckets[index].append(entry)  # reuse the (key, value) tuple
+
+    def _rehash_step(self):
+        # migrate up to rehash_step non-empty old buckets, redis style
+        # empty visits are capped at 10x the step so one op never walks a long empty run
+        old_buckets = self.old_buckets
+        new_buckets = self.buckets
+        capacity = self.capacity
+        index = self.rehash_index
+        moved = 0
+        empty_visits = self.rehash_step * 10
+
+        while index < self.old_capacity and moved < self.rehash_step:
+            bucket = old_buckets[index]
+            index += 1
+            if not bucket:
+                empty_visits -= 1
+                if empty_visits == 0:
+                    break
+                continue
+
+            for entry in bucket:
+                new_index = hash(entry[0]) % capacity
+                if new_buckets[new_index] is None:
+                    new_buckets[new_index] = [entry]
+                else:
+                    new_buckets[new_index].append(entry)
+            old_buckets[index - 1] = None
+            moved += 1
+
+        self.rehash_index = index
+        if index >= self.old_capacity:
+            self.old_buckets = None  # resize done, drop the old table
+
+    def _finish_rehash(self):
+        # drain whatever is left of the old table
+        while self.old_buckets is not None:
+            self._rehash_step()
+
     def put(self, key, value):
+        if self.old_buckets is not None:
+            self._rehash_step()
+
         # check if resize needed before insertion
         if self.size >= self.capacity * self.load_factor_threshold:
             self._resize()
-        
-        # find target bucket using hash function
-        bucket_index = self._hash_function(key)
-        target_bucket = self.buckets[bucket_index]
-        
+
+        # find target bucket
+        table, bucket_index = self._locate(key)
+        target_bucket = table[bucket_index]
+        if target_bucket is None:
+            table[bucket_index] = [(key, value)]
+            self.size += 1
+            return
+
         # check if key already exists in bucket, update if found
         for i, (existing_key, existing_value) in enumerate(target_bucket):
             if existing_key == key:
                 target_bucket[i] = (key, value)  # update existing key-value pair
                 return
-        
+
         # key not found, append new key-value pair to bucket
         target_bucket.append((key, value))
         self.size += 1
-    
+
     def get(self, key):
+        if self.old_buckets is not None:
+            self._rehash_step()
+
         # find target bucket and search for key
-        bucket_index = self._hash_function(key)
-        target_bucket = self.buckets[bucket_index]
-        
+        table, bucket_index = self._locate(key)
+        target_bucket = table[bucket_index]
+
         # linear search in bucket for matching key
-        for existing_key, existing_value in target_bucket:
-            if existing_key == key:
-                return existing_value  # return value if key found
-        
+        if target_bucket:
+            for existing_key, existing_value in target_bucket:
+                if existing_key == key:
+                    return existing_value  # return value if key found
+
         # key not found, raise KeyError
         raise KeyError(f"Key '{key}' not found")
-    
+
     def remove(self, key):
+        if self.old_buckets is not None:
+            self._rehash_step()
+
         # find target bucket and remove key-value pair
-        bucket_index = self._hash_function(key)
-        target_bucket = self.buckets[bucket_index]
-        
+        table, bucket_index = self._locate(key)
+        target_bucket = table[bucket_index]
+
         # search and remove key-value pair from bucket
-        for i, (existing_key, existing_value) in enumerate(target_bucket):
-            if existing_key == key:
-                removed_value = target_bucket.pop(i)  # remove and return (key, value) tuple
-                self.size -= 1
-                return removed_value[1]  # return only the value
-        
+        if target_bucket:
+            for i, (existing_key, existing_value) in enumerate(target_bucket):
+                if existing_key == key:
+                    removed_value = target_bucket.pop(i)  # remove and return (key, value) tuple
+                    self.size -= 1
+                    return removed_value[1]  # return only the value
+
         # key not found, raise KeyError
         raise KeyError(f"Key '{key}' not found")
-    
+
+    def _reserve(self, expected_size):
+        # presize once so expected_size entries fit under the load factor, no-op if they already do
+        new_capacity = self.capacity
+        while expected_size >= new_capacity * self.load_factor_threshold:
+            new_capacity *= 2
+        if new_capacity != self.capacity:
+            self._resize(new_capacity)  # one full rehash, even in incremental mode
+
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        # build a table from (key, value) pairs sized up front, instead of ~log2(n) resizes from 16
+        if expected_size is None and hasattr(items, "__len__"):
+            expected_size = len(items)
+        table = cls(**kwargs)
+        if expected_size:
+            table._reserve(expected_size)
+        table.put_many(items)
+        return table
+
+    def put_many(self, items):
+        # bulk put: reserve room for the whole batch once, then insert with no per-key load factor check
+        if not hasattr(items, "__len__"):
+            items = list(items)
+        self._reserve(self.size + len(items))  # upper bound, duplicate keys just leave some headroom
+
+        buckets, capacity = self.buckets, self.capacity
+        old_buckets, old_capacity, rehash_index = self.old_buckets, self.old_capacity, self.rehash_index
+        added = 0
+        for key, value in items:
+            key_hash = hash(key)  # hashed once, same routing as _locate
+            if old_buckets is not None and key_hash % old_capacity >= rehash_index:
+                table, bucket_index = old_buckets, key_hash % old_capacity
+            else:
+                table, bucket_index = buckets, key_hash % capacity
+
+            target_bucket = table[bucket_index]
+            if target_bucket is None:
+                table[bucket_index] = [(key, value)]
+                added += 1
+                continue
+            for i, entry in enumerate(target_bucket):
+                if entry[0] == key:
+                    target_bucket[i] = (key, value)
+                    break
+            else:
+                target_bucket.append((key, value))
+                added += 1
+        self.size += added
+
+    def get_many(self, keys, default=None, return_mask=False):
+        # bulk get: missing keys come back as default instead of raising KeyError
+        # with return_mask=True also return a parallel list of booleans, True where the key was found
+        buckets, capacity = self.buckets, self.capacity
+        old_buckets, old_capacity, rehash_index = self.old_buckets, self.old_capacity, self.rehash_index
+        values = []
+        found = []
+        for key in keys:
+            key_hash = hash(key)
+            if old_buckets is not None and key_hash % old_capacity >= rehash_index:
+                target_bucket = old_buckets[key_hash % old_capacity]
+            else:
+                target_bucket = buckets[key_hash % capacity]
+
+            value, hit = default, False
+            if target_bucket:
+                for existing_key, existing_value in target_bucket:
+                    if existing_key == key:
+                        value, hit = existing_value, True
+                        break
+            values.append(value)
+            found.append(hit)
+
+        if return_mask:
+            return values, found
+        return values
+
+    def remove_many(self, keys, default=None):
+        # bulk remove: returns removed values in key order, default for keys that were not there
+        buckets, capacity = self.buckets, self.capacity
+        old_buckets, old_capacity, rehash_index = self.old_buckets, self.old_capacity, self.rehash_index
+        removed = []
+        for key in keys:
+            key_hash = hash(key)
+            if old_buckets is not None and key_hash % old_capacity >= rehash_index:
+                target_bucket = old_buckets[key_hash % old_capacity]
+            else:
+                target_bucket = buckets[key_hash % capacity]
+
+            value = default
+            if target_bucket:
+                for i, entry in enumerate(target_bucket):
+                    if entry[0] == key:
+                        value = target_bucket.pop(i)[1]
+                        self.size -= 1
+                        break
+            removed.append(value)
+        return removed
+
     def __len__(self):
         return self.size
-    
+
+    def __str__(self):
+        # display all key-value pairs for debugging, both tables while a resize is in progress
+        pairs = []
+        for table in (self.old_buckets or [], self.buckets):
+            for bucket in table:
+                for key, value in bucket or ():
+                    pairs.append(f"{key}: {value}")
+        return "{" + ", ".join(pairs) + "}"
+
+
+# slot markers for open addressing, compared by identity so any user key (even None) is allowed
+_EMPTY = object()
+_TOMBSTONE = object()
+
+
+class OpenAddressingHashTable(HashTable):
+    def __init__(self, initial_capacity=16, engine="open_addressing", incremental_resize=False, rehash_step=4):
+        if incremental_resize:
+            # probe chains cross slot boundaries, so a half-migrated table cannot be probed
+            raise ValueError("incremental_resize is only supported by the chaining engine")
+
+        # capacity is a power of two so the probe start is hash & mask instead of a modulo
+        self.capacity = 8
+        while self.capacity < initial_capacity:
+            self.capacity *= 2
+        self.size = 0  # live entries
+        self.used = 0  # live entries + tombstones, this is what drives probe length
+        self.load_factor_threshold = 0.66  # linear probing degrades fast past ~2/3 full, same bound as cpython dict
+
+        # flat parallel arrays, slot i holds keys[i] -> values[i], hashes[i] caches hash(keys[i])
+        self.keys = [_EMPTY] * self.capacity
+        self.values = [None] * self.capacity
+        self.hashes = array('q', bytes(8 * self.capacity))  # raw int64, no python int object per slot
+
+    def _find_slot(self, key, key_hash):
+        # linear probing, returns (slot index, found)
+        # when not found, index is the first tombstone on the probe path (reuse it) or the empty slot that ended it
+        keys = self.keys
+        hashes = self.hashes
+        mask = self.capacity - 1
+        index = key_hash & mask
+        first_tombstone = -1
+
+        # bounded by the table size, only a lock-free reader racing a resize can walk off a full probe
+        for _ in range(mask + 1):
+            slot_key = keys[index]
+            if slot_key is _EMPTY:
+                return (first_tombstone if first_tombstone >= 0 else index), False
+            if slot_key is _TOMBSTONE:
+                if first_tombstone < 0:
+                    first_tombstone = index
+            elif hashes[index] == key_hash and (slot_key is key or slot_key == key):
+                return index, True
+            index = (index + 1) & mask
+
+        if first_tombstone >= 0:
+            return first_tombstone, False
+        raise RuntimeError("probe sequence exhausted, table changed during lookup")
+
+    def _resize(self, new_capacity=None):
+        # rebuild into fresh arrays, this also drops every tombstone
+        # grow only when live entries need it, a table full of tombstones is just cleaned at the same size
+        if new_capacity is None:
+            new_capacity = self.capacity
+            if self.size + 1 >= new_capacity * self.load_factor_threshold / 2:
+                new_capacity *= 2
+
+        old_keys, old_values, old_hashes = self.keys, self.values, self.hashes
+        self.capacity = new_capacity
+        self.keys = keys = [_EMPTY] * new_capacity
+        self.values = values = [None] * new_capacity
+        self.hashes = hashes = array('q', bytes(8 * new_capacity))
+        self.used = self.size
+        mask = new_capacity - 1
+
+        # reuse cached hashes, no __hash__ call and no equality check needed since keys are already unique
+        for i, key in enumerate(old_keys):
+            if key is _EMPTY or key is _TOMBSTONE:
+                continue
+            key_hash = old_hashes[i]
+            index = key_hash & mask
+            while keys[index] is not _EMPTY:
+                index = (index + 1) & mask
+            keys[index] = key
+            values[index] = old_values[i]
+            hashes[index] = key_hash
+
+    def put(self, key, value):
+        # check if resize needed before insertion, tombstones count since they lengthen probes too
+        if self.used + 1 > self.capacity * self.load_factor_threshold:
+            self._resize()
+
+        key_hash = hash(key)
+        index, found = self._find_slot(key, key_hash)
+        if found:
+            self.values[index] = value  # update existing key
+            return
+
+        if self.keys[index] is _EMPTY:
+            self.used += 1  # reusing a tombstone does not add a used slot
+        self.keys[index] = key
+        self.values[index] = value
+        self.hashes[index] = key_hash
+        self.size += 1
+
+    def get(self, key):
+        index, found = self._find_slot(key, hash(key))
+        if found:
+            return self.values[index]
+
+        # key not found, raise KeyError
+        raise KeyError(f"Key '{key}' not found")
+
+    def remove(self, key):
+        index, found = self._find_slot(key, hash(key))
+        if not found:
+            raise KeyError(f"Key '{key}' not found")
+
+        # leave a tombstone so probe chains running through this slot stay intact
+        value = self.values[index]
+        self.keys[index] = _TOMBSTONE
+        self.values[index] = None  # drop the reference so the value can be freed
+        self.size -= 1
+        return value
+
+    def _reserve(self, expected_size):
+        # presize once so expected_size entries fit under the load factor, no-op if they already do
+        if self.used - self.size + expected_size < self.capacity * self.load_factor_threshold:
+            return
+        new_capacity = self.capacity
+        while expected_size >= new_capacity * self.load_factor_threshold:
+            new_capacity *= 2
+        self._resize(new_capacity)
+
+    def put_many(self, items):
+        # bulk put: reserve room for the whole batch once, then insert with no per-key load factor check
+        if not hasattr(items, "__len__"):
+            items = list(items)
+        self._reserve(self.size + len(items))
+
+        keys, values, hashes = self.keys, self.values, self.hashes
+        find_slot = self._find_slot
+        for key, value in items:
+            key_hash = hash(key)
+            index, found = find_slot(key, key_hash)
+            if not found:
+                if keys[index] is _EMPTY:
+                    self.used += 1
+                keys[index] = key
+                hashes[index] = key_hash
+                self.size += 1
+            values[index] = value
+
+    def get_many(self, keys, default=None, return_mask=False):
+        # bulk get: missing keys come back as default instead of raising KeyError
+        # with return_mask=True also return a parallel list of booleans, True where the key was found
+        slot_values = self.values
+        find_slot = self._find_slot
+        values = []
+        found = []
+        for key in keys:
+            index, hit = find_slot(key, hash(key))
+            values.append(slot_values[index] if hit else default)
+            found.append(hit)
+
+        if return_mask:
+            return values, found
+        return values
+
+    def remove_many(self, keys, default=None):
+        # bulk remove: returns removed values in key order, default for keys that were not there
+        slot_keys, slot_values = self.keys, self.values
+        find_slot = self._find_slot
+        removed = []
+        for key in keys:
+            index, hit = find_slot(key, hash(key))
+            if hit:
+                removed.append(slot_values[index])
+                slot_keys[index] = _TOMBSTONE
+                slot_values[index] = None
+                self.size -= 1
+            else:
+                removed.append(default)
+        return removed
+
     def __str__(self):
         # display all key-value pairs for debugging
         pairs = []
-        for bucket in self.buckets:
-            for key, value in bucket:
+        for key, value in zip(self.keys, self.values):
+            if key is not _EMPTY and key is not _TOMBSTONE:
                 pairs.append(f"{key}: {value}")
-        return "{" + ", ".join(pairs) + "}"
\ No newline at end of file
+        return "{" + ", ".join(pairs) + "}"
+
+
+class ShardedHashTable:
+    def __init__(self, num_shards=16, initial_capacity=16, engine="chaining"):
+        # shard count is rounded up to a power of two so the shard is picked from the top bits of a multiplied hash
+        # (the segments index buckets by the low bits of the same hash, so hash % num_shards would leave most
+        # of every segment's buckets unused)
+        self.shard_bits = max(0, (num_shards - 1).bit_length())
+        self.num_shards = 1 << self.shard_bits
+
+        # segments never use incremental resize: get() would migrate buckets, which is a write
+        self.shards = [HashTable(initial_capacity, engine=engine) for _ in range(self.num_shards)]
+        self.locks = [threading.Lock() for _ in range(self.num_shards)]  # writer lock per shard
+
+        # seqlock counters: a writer bumps its shard's counter before and after every mutation (odd = write in flight)
+        # readers run without the lock and only trust a result if the counter was even and unchanged around it
+        # this relies on the gil making each list read/write atomic
+        self.sequences = [0] * self.num_shards
+
+    def _shard_index(self, key):
+        # fibonacci hashing, top shard_bits of hash * 2^64/phi
+        if not self.shard_bits:
+            return 0
+        return ((hash(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.shard_bits)
+
+    def _group_by_shard(self, keys):
+        # {shard index: [(position in input, key), ...]} so bulk ops visit each shard once
+        groups = {}
+        shard_index = self._shard_index
+        for position, key in enumerate(keys):
+            groups.setdefault(shard_index(key), []).append((position, key))
+        return groups
+
+    def _write(self, index, method, *args):
+        # run a mutating shard method under the shard lock, bracketed by sequence bumps
+        sequences = self.sequences
+        with self.locks[index]:
+            sequences[index] += 1
+            try:
+                return method(*args)
+            finally:
+                sequences[index] += 1
+
+    def _read(self, index, method, *args):
+        # optimistic read first, no lock taken
+        # a torn read during a concurrent write can miss, raise or see a half-resized table, in all of those
+        # cases the sequence moved and we fall back to reading under the shard lock
+        sequences = self.sequences
+        sequence = sequences[index]
+        if not sequence & 1:
+            try:
+                result = method(*args)
+            except KeyError:
+                if sequences[index] == sequence:
+                    raise  # genuine miss
+            except Exception:
+                pass  # torn read
+            else:
+                if sequences[index] == sequence:
+                    return result
+
+        with self.locks[index]:
+            return method(*args)
+
+    def put(self, key, value):
+        index = self._shard_index(key)
+        self._write(index, self.shards[index].put, key, value)
+
+    def get(self, key):
+        index = self._shard_index(key)
+        return self._read(index, self.shards[index].get, key)
+
+    def remove(self, key):
+        index = self._shard_index(key)
+        return self._write(index, self.shards[index].remove, key)
+
+    def put_many(self, items):
+        groups = {}
+        shard_index = self._shard_index
+        for item in items:
+            groups.setdefault(shard_index(item[0]), []).append(item)
+
+        for index, shard_items in groups.items():
+            self._write(index, self.shards[index].put_many, shard_items)
+
+    def get_many(self, keys, default=None, return_mask=False):
+        # results come back in input order, each shard is read once for its whole group
+        if not hasattr(keys, "__len__"):
+            keys = list(keys)
+        values = [default] * len(keys)
+        found = [False] * len(keys)
+
+        for index, group in self._group_by_shard(keys).items():
+            shard_values, shard_found = self._read(
+                index, self.shards[index].get_many, [key for _, key in group], default, True)
+            for (position, _), value, hit in zip(group, shard_values, shard_found):
+                values[position] = value
+                found[position] = hit
+
+        if return_mask:
+            return values, found
+        return values
+
+    def remove_many(self, keys, default=None):
+        if not hasattr(keys, "__len__"):
+            keys = list(keys)
+        removed = [default] * len(keys)
+
+        for index, group in self._group_by_shard(keys).items():
+            shard_removed = self._write(index, self.shards[index].remove_many, [key for _, key in group], default)
+            for (position, _), value in zip(group, shard_removed):
+                removed[position] = value
+        return removed
+
+    def __len__(self):
+        # sum of shard sizes, not a consistent snapshot while writers are running
+        return sum(len(shard) for shard in self.shards)
+
+    def __str__(self):
+        # display all key-value pairs for debugging
+        inner = ", ".join(str(shard)[1:-1] for shard in self.shards if len(shard))
+        return "{" + inner + "}"
+
+
+class _GlobalLockHashTable:
+    # the baseline we are replacing: one HashTable behind one lock
+    def __init__(self, engine="chaining"):
+        self.table = HashTable(engine=engine)
+        self.lock = threading.Lock()
+
+    def put(self, key, value):
+        with self.lock:
+            self.table.put(key, value)
+
+    def get(self, key):
+        with self.lock:
+            return self.table.get(key)
+
+
+def benchmark_engines(n=500_000):
+    # compare chaining vs open addressing on memory per entry and ops/sec for put / get / remove
+    keys = [f"key-{i}" for i in range(n)]  # built before measuring so only table overhead is counted
+
+    print(f"{'engine':<16}{'bytes/entry':>12}{'put ops/s':>14}{'get ops/s':>14}{'remove ops/s':>14}")
+    for engine in ENGINES:
+        # memory pass, values are shared ints so we only see the table's own structures
+        tracemalloc.start()
+        table = HashTable(engine=engine)
+        for key in keys:
+            table.put(key, 1)
+        table_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del table
+
+        # speed pass without tracemalloc overhead
+        table = HashTable(engine=engine)
+        start = time.perf_counter()
+        for key in keys:
+            table.put(key, 1)
+        put_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for key in keys:
+            table.get(key)
+        get_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for key in keys:
+            table.remove(key)
+        remove_time = time.perf_counter() - start
+
+        print(f"{engine:<16}{table_bytes / n:>12.1f}{n / put_time:>14,.0f}{n / get_time:>14,.0f}{n / remove_time:>14,.0f}")
+
+
+def benchmark_resize_latency(n=1_000_000):
+    # per-put latency distribution, stop-the-world resize vs incremental resize
+    keys = [f"key-{i}" for i in range(n)]
+    clock = time.perf_counter_ns
+    gc.disable()  # cyclic gc passes over millions of tuples would swamp the resize pauses we want to see
+
+    print(f"{'resize':<14}{'p50 us':>10}{'p99 us':>10}{'p99.9 us':>10}{'max us':>12}{'total s':>10}")
+    for incremental in (False, True):
+        table = HashTable(incremental_resize=incremental)
+        latencies = [0] * n
+        for i, key in enumerate(keys):
+            start = clock()
+            table.put(key, i)
+            latencies[i] = clock() - start
+        total = sum(latencies) / 1e9
+
+        latencies.sort()
+        p50, p99, p999 = (latencies[int(n * q)] / 1000 for q in (0.5, 0.99, 0.999))
+        mode = "incremental" if incremental else "full"
+        print(f"{mode:<14}{p50:>10.2f}{p99:>10.2f}{p999:>10.2f}{latencies[-1] / 1000:>12.1f}{total:>10.2f}")
+    gc.enable()
+
+
+def benchmark_bulk_load(n=1_000_000):
+    # loading a batch: put() loop growing from 16 vs from_items presized + put_many, then get_many
+    items = [(f"key-{i}", i) for i in range(n)]
+    keys = [key for key, _ in items]
+
+    print(f"{'engine':<16}{'put loop s':>12}{'from_items s':>14}{'get loop s':>12}{'get_many s':>12}")
+    for engine in ENGINES:
+        start = time.perf_counter()
+        table = HashTable(engine=engine)
+        for key, value in items:
+            table.put(key, value)
+        put_loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = HashTable.from_items(items, engine=engine)
+        bulk_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for key in keys:
+            table.get(key)
+        get_loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table.get_many(keys)
+        get_many = time.perf_counter() - start
+
+        print(f"{engine:<16}{put_loop:>12.2f}{bulk_load:>14.2f}{get_loop:>12.2f}{get_many:>12.2f}")
+
+
+def benchmark_threads(num_keys=200_000, ops_per_thread=200_000, thread_counts=(1, 2, 4, 8), write_ratio=0.1):
+    # mixed get/put throughput across thread counts, one global lock vs ShardedHashTable
+    # note cpython's gil still serializes the python bytecode, sharding removes lock convoying, not the gil
+    keys = [f"key-{i}" for i in range(num_keys)]
+
+    print(f"{'threads':<10}{'global lock ops/s':>20}{'sharded ops/s':>16}")
+    for num_threads in thread_counts:
+        row = []
+        for table in (_GlobalLockHashTable(), ShardedHashTable()):
+            for key in keys:
+                table.put(key, 0)
+
+            barrier = threading.Barrier(num_threads + 1)
+
+            def worker(seed):
+                # each thread walks the key space with its own stride, writes every 1/write_ratio-th op
+                write_every = int(1 / write_ratio) if write_ratio else 0
+                index = seed
+                barrier.wait()
+                for op in range(ops_per_thread):
+                    key = keys[index % num_keys]
+                    if write_every and op % write_every == 0:
+                        table.put(key, op)
+                    else:
+                        table.get(key)
+                    index += 7919
+
+            threads = [threading.Thread(target=worker, args=(t,)) for t in range(num_threads)]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            row.append(num_threads * ops_per_thread / (time.perf_counter() - start))
+
+        print(f"{num_threads:<10}{row[0]:>20,.0f}{row[1]:>16,.0f}")
+
+
+if __name__ == "__main__":
+    for engine in ENGINES:
+        table = HashTable(engine=engine)
+        table.put("apple", 1)
+        table.put("banana", 2)
+        table.put("apple", 3)
+        table.remove("banana")
+        print(f"{engine}: {table}, len={len(table)}, apple={table.get('apple')}")
+
+    benchmark_engines()
+    benchmark_resize_latency()
+    benchmark_bulk_load()
+    benchmark_threads()
@@ -0,0 +1,307 @@
+"""
+file-backed version of hash_table.HashTable for byte keys and values
+
+the whole slot array lives in an mmap'd file, so:
+- reopening is O(1), just map the file and read the header, no rebuild from source data
+- several reader processes opening the same file share its pages through the os page cache
+- flush() pushes dirty pages to disk, resize writes a new file and renames it over the old one,
+  so a crash mid-resize leaves the previous file intact
+- after the rename the writer marks the old file superseded, readers still mapping it notice and remap path
+
+layout: 64 byte header, then capacity fixed-size slots, open addressing with linear probing + tombstones
+slot = state u8 | hash u64 | key_len u16 | value_len u32 | key bytes[key_width] | value bytes[value_width]
+keys and values are length-prefixed up to key_width / value_width, fixed-width data just always uses the max
+
+"""
+import hashlib
+import mmap
+import os
+import random
+import struct
+import tempfile
+import time
+
+from hash_table import HashTable
+
+
+_MAGIC = b"HTMMAP01"
+_HEADER = struct.Struct("<8sQQQII")  # magic, capacity, size, used, key_width, value_width
+_HEADER_SIZE = 64
+_SUPERSEDED = struct.Struct("<I")  # right after _HEADER, set to 1 once a resize has renamed a new file over this one
+_SUPERSEDED_OFFSET = _HEADER.size
+_SLOT_HEADER = struct.Struct("<BQHI")  # state, hash, key_len, value_len
+
+# slot states
+_EMPTY = 0
+_LIVE = 1
+_TOMBSTONE = 2
+
+
+def _stable_hash(key):
+    # python's hash() of bytes is salted per process, the file needs the same hash in every process
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class MmapHashTable:
+    def __init__(self, path, key_width=32, value_width=64, initial_capacity=1024, readonly=False):
+        # open path if it exists (widths come from its header), otherwise create it
+        self.path = path
+        self.readonly = readonly
+        self.load_factor_threshold = 0.66  # same bound as the in-memory open addressing engine
+
+        if not readonly and os.path.exists(path + ".resize"):
+            os.remove(path + ".resize")  # side file of a resize that crashed before its rename, path is still whole
+        if not os.path.exists(path):
+            if readonly:
+                raise FileNotFoundError(path)
+            capacity = 8
+            while capacity < initial_capacity:
+                capacity *= 2
+            self._create_file(path, capacity, key_width, value_width)
+
+        self._open()
+
+    def _create_file(self, path, capacity, key_width, value_width):
+        # empty table file: header + zeroed slots (state 0 == empty)
+        slot_size = _SLOT_HEADER.size + key_width + value_width
+        with open(path, "wb") as f:
+            f.truncate(_HEADER_SIZE + capacity * slot_size)
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, capacity, 0, 0, key_width, value_width))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _open(self):
+        # map the file and read the header, this is all a reopen costs
+        self.file = open(self.path, "rb" if self.readonly else "r+b")
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=access)
+
+        magic, self.capacity, self.size, self.used, self.key_width, self.value_width = _HEADER.unpack_from(self.mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a MmapHashTable file")
+        self.slot_size = _SLOT_HEADER.size + self.key_width + self.value_width
+
+    def _remap_if_superseded(self):
+        # a reader's mapping keeps the old file alive after a resize replaced it, follow path to the current one
+        while _SUPERSEDED.unpack_from(self.mm, _SUPERSEDED_OFFSET)[0]:
+            self.close()
+            self._open()
+
+    def _write_header(self):
+        _HEADER.pack_into(self.mm, 0, _MAGIC, self.capacity, self.size, self.used, self.key_width, self.value_width)
+
+    def _slot_offset(self, index):
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _find_slot(self, key, key_hash):
+        # linear probing over the mapped slots, returns (slot index, found)
+        # when not found, index is the first tombstone on the probe path or the empty slot that ended it
+        mm = self.mm
+        unpack_from = _SLOT_HEADER.unpack_from
+        key_start = _SLOT_HEADER.size
+        slot_size = self.slot_size
+        mask = self.capacity - 1
+        index = key_hash & mask
+        first_tombstone = -1
+
+        for _ in range(mask + 1):
+            offset = _HEADER_SIZE + index * slot_size
+            state, slot_hash, key_len, _ = unpack_from(mm, offset)
+            if state == _EMPTY:
+                return (first_tombstone if first_tombstone >= 0 else index), False
+            if state == _TOMBSTONE:
+                if first_tombstone < 0:
+                    first_tombstone = index
+            elif slot_hash == key_hash and key_len == len(key) and \
+                    mm[offset + key_start:offset + key_start + key_len] == key:
+                return index, True
+            index = (index + 1) & mask
+
+        if first_tombstone >= 0:
+            return first_tombstone, False
+        raise RuntimeError("probe sequence exhausted, table file changed during lookup")
+
+    def _check_writable(self):
+        if self.readonly:
+            raise PermissionError(f"{self.path} is opened read-only")
+
+    def _resize(self):
+        # crash-safe resize: build the bigger table in a side file, fsync it, then atomically rename over path
+        # a crash before the rename leaves the old file untouched, after it the new file is complete
+        new_capacity = self.capacity
+        if self.size + 1 >= new_capacity * self.load_factor_threshold / 2:
+            new_capacity *= 2  # otherwise the table is mostly tombstones, rebuild at the same size
+        tmp_path = self.path + ".resize"
+        self._create_file(tmp_path, new_capacity, self.key_width, self.value_width)
+
+        with open(tmp_path, "r+b") as f:
+            new_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+            old_mm = self.mm
+            slot_size = self.slot_size
+            mask = new_capacity - 1
+            unpack_from = _SLOT_HEADER.unpack_from
+
+            # copy live slots byte for byte, the stored hash means no key is rehashed
+            for index in range(self.capacity):
+                offset = _HEADER_SIZE + index * slot_size
+                state, slot_hash, _, _ = unpack_from(old_mm, offset)
+                if state != _LIVE:
+                    continue
+                new_index = slot_hash & mask
+                while new_mm[_HEADER_SIZE + new_index * slot_size] != _EMPTY:
+                    new_index = (new_index + 1) & mask
+                new_offset = _HEADER_SIZE + new_index * slot_size
+                new_mm[new_offset:new_offset + slot_size] = old_mm[offset:offset + slot_size]
+
+            _HEADER.pack_into(new_mm, 0, _MAGIC, new_capacity, self.size, self.size, self.key_width, self.value_width)
+            new_mm.flush()
+            new_mm.close()
+            os.fsync(f.fileno())
+
+        # rename first, then flag the old file, so a reader that sees the flag and reopens path gets the new one
+        os.replace(tmp_path, self.path)
+        _SUPERSEDED.pack_into(self.mm, _SUPERSEDED_OFFSET, 1)
+        self.close()
+        self._open()
+
+    def put(self, key, value):
+        self._check_writable()
+        if len(key) > self.key_width or len(value) > self.value_width:
+            raise ValueError(f"key/value longer than key_width={self.key_width} / value_width={self.value_width}")
+
+        # check if resize needed before insertion, tombstones count since they lengthen probes too
+        if self.used + 1 > self.capacity * self.load_factor_threshold:
+            self._resize()
+
+        key_hash = _stable_hash(key)
+        index, found = self._find_slot(key, key_hash)
+        offset = self._slot_offset(index)
+        key_start = offset + _SLOT_HEADER.size
+        value_start = key_start + self.key_width
+        mm = self.mm
+
+        if not found:
+            if mm[offset] == _EMPTY:
+                self.used += 1
+            self.size += 1
+            mm[key_start:key_start + len(key)] = key
+
+        # data first, the slot header last, so a reader never sees a new slot go live before its bytes are there
+        mm[value_start:value_start + len(value)] = value
+        _SLOT_HEADER.pack_into(mm, offset, _LIVE, key_hash, len(key), len(value))
+        if not found:
+            self._write_header()
+
+    def get(self, key):
+        if self.readonly:
+            self._remap_if_superseded()
+        index, found = self._find_slot(key, _stable_hash(key))
+        if not found:
+            raise KeyError(f"Key '{key}' not found")
+
+        offset = self._slot_offset(index)
+        value_len = _SLOT_HEADER.unpack_from(self.mm, offset)[3]
+        value_start = offset + _SLOT_HEADER.size + self.key_width
+        return self.mm[value_start:value_start + value_len]
+
+    def remove(self, key):
+        self._check_writable()
+        index, found = self._find_slot(key, _stable_hash(key))
+        if not found:
+            raise KeyError(f"Key '{key}' not found")
+
+        offset = self._slot_offset(index)
+        value_len = _SLOT_HEADER.unpack_from(self.mm, offset)[3]
+        value_start = offset + _SLOT_HEADER.size + self.key_width
+        value = self.mm[value_start:value_start + value_len]
+        self.mm[offset] = _TOMBSTONE  # probe chains through this slot stay intact
+        self.size -= 1
+        self._write_header()
+        return value
+
+    def flush(self):
+        # msync dirty pages to disk, until then a crash may lose recent puts (the os still has them)
+        if not self.readonly:
+            self.mm.flush()
+
+    def close(self):
+        if self.mm is not None:
+            self.flush()
+            self.mm.close()
+            self.file.close()
+            self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        if self.readonly:
+            # a reader process sees the writer's header updates through the shared mapping
+            self._remap_if_superseded()
+            return _HEADER.unpack_from(self.mm, 0)[2]
+        return self.size
+
+    def __str__(self):
+        # display all key-value pairs for debugging
+        if self.readonly:
+            self._remap_if_superseded()
+        pairs = []
+        for index in range(self.capacity):
+            offset = self._slot_offset(index)
+            state, _, key_len, value_len = _SLOT_HEADER.unpack_from(self.mm, offset)
+            if state == _LIVE:
+                key_start = offset + _SLOT_HEADER.size
+                value_start = key_start + self.key_width
+                pairs.append(f"{self.mm[key_start:key_start + key_len]}: {self.mm[value_start:value_start + value_len]}")
+        return "{" + ", ".join(pairs) + "}"
+
+
+def benchmark_startup(n=1_000_000, lookups=10_000):
+    # process start cost: rebuild an in-memory HashTable from source data vs reopen the mmap file
+    items = [(b"key-%d" % i, b"value-%d" % i) for i in range(n)]
+    probe_keys = [items[random.randrange(n)][0] for _ in range(lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "table.htm")
+        start = time.perf_counter()
+        with MmapHashTable(path, key_width=16, value_width=16, initial_capacity=int(n / 0.6)) as table:
+            for key, value in items:
+                table.put(key, value)
+        build_file = time.perf_counter() - start
+
+        start = time.perf_counter()
+        memory_table = HashTable.from_items(items)
+        for key in probe_keys:
+            memory_table.get(key)
+        rebuild = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with MmapHashTable(path, readonly=True) as table:
+            opened = time.perf_counter() - start
+            for key in probe_keys:
+                table.get(key)
+        reopen = time.perf_counter() - start
+
+    print(f"{n:,} entries, one-time file build {build_file:.2f}s")
+    print(f"rebuild in memory + {lookups:,} gets: {rebuild:.3f}s")
+    print(f"reopen mmap file + {lookups:,} gets: {reopen:.3f}s (open alone {opened * 1000:.2f}ms)")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "demo.htm")
+        with MmapHashTable(path, key_width=8, value_width=8, initial_capacity=8) as table:
+            for i in range(20):  # enough to force a couple of file resizes
+                table.put(b"k%d" % i, b"v%d" % i)
+            table.remove(b"k3")
+            table.flush()
+
+        with MmapHashTable(path, readonly=True) as table:
+            print(f"reopened: len={len(table)}, k7={table.get(b'k7')}, capacity={table.capacity}")
+
+    benchmark_startup()
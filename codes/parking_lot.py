@@ -5,10 +5,19 @@ as long as the car size does not exceed the parking size
 
 """
 
+import heapq
+import itertools
+import math
+import random
+import time
+import tracemalloc
 import uuid
+from array import array
 from enum import Enum
 from collections import deque
 
+from slot_store import DeltaLog, IndexQueue, bulk_new, read_snapshot_file, replay_deltas, write_snapshot_file
+
 class Size(Enum):
     SMALL = 0
     MEDIUM = 1
@@ -49,34 +58,158 @@ class ParkingSpot():
 
         return car
     
+class TimingWheel():
+    # hierarchical timing wheel: level k has 64 slots of 64**k ticks each, an entry sits at the highest level where
+    # its expiry tick differs from the current tick, and drops to lower levels as time reaches its slot
+    # a 64-bit mask per level marks the non-empty slots, so advance() jumps straight to the next non-empty slot
+    # instead of stepping tick by tick: O(expired + cascades) per advance, at most one cascade per level per entry
+    BITS = 6
+    SLOTS = 1 << BITS
+
+    def __init__(self, resolution=1.0, start=0.0):
+        self.resolution = resolution
+        self.current = math.floor(start / resolution)  # current tick
+        self.levels = []  # levels[k][slot] -> {key: (expiry tick, value)} or None
+        self.masks = []  # masks[k] bit slot set when levels[k][slot] is non-empty
+        self.location = {}  # key -> (level, slot), level -1 = already due, handed out by the next advance
+        self.due = {}  # key -> (expiry tick, value)
+
+    def __len__(self):
+        return len(self.location)
+
+    def items(self):
+        # (key, value) of everything still scheduled, in no particular order
+        for key, (level, slot) in self.location.items():
+            bucket = self.due if level < 0 else self.levels[level][slot]
+            yield key, bucket[key][1]
+
+    def schedule(self, key, until, value=None):
+        # expire key at time until, never early, at most one resolution late
+        if key in self.location:
+            self.cancel(key)
+        self._place(key, math.ceil(until / self.resolution), value)
+
+    def _place(self, key, expiry, value):
+        if expiry <= self.current:
+            self.due[key] = (expiry, value)
+            self.location[key] = (-1, 0)
+            return
+        level = ((expiry ^ self.current).bit_length() - 1) // self.BITS  # highest base-64 digit that differs
+        while len(self.levels) <= level:
+            self.levels.append([None] * self.SLOTS)
+            self.masks.append(0)
+        slot = (expiry >> (level * self.BITS)) & (self.SLOTS - 1)
+        if self.levels[level][slot] is None:
+            self.levels[level][slot] = {}
+            self.masks[level] |= 1 << slot
+        self.levels[level][slot][key] = (expiry, value)
+        self.location[key] = (level, slot)
+
+    def cancel(self, key):
+        # O1, returns False if key is not scheduled
+        if key not in self.location:
+            return False
+        level, slot = self.location.pop(key)
+        if level < 0:
+            del self.due[key]
+            return True
+        bucket = self.levels[level][slot]
+        del bucket[key]
+        if not bucket:
+            self.levels[level][slot] = None
+            self.masks[level] &= ~(1 << slot)
+        return True
+
+    def _next_slot(self):
+        # (tick, level, slot) of the earliest non-empty slot after the current tick, None if the wheel is empty
+        # lower levels always come first: they hold expiries inside the current block of the level above
+        for level, mask in enumerate(self.masks):
+            shift = level * self.BITS
+            digit = (self.current >> shift) & (self.SLOTS - 1)
+            later = mask >> (digit + 1)
+            if later:
+                slot = digit + (later & -later).bit_length()
+                block = (self.current >> (shift + self.BITS)) << (shift + self.BITS)
+                return block | (slot << shift), level, slot
+        return None
+
+    def advance(self, now):
+        # move the clock to now, returns [(key, value), ...] of everything that expired, in expiry order
+        target = math.floor(now / self.resolution)
+        expired = [(key, value) for key, (_, value) in sorted(self.due.items(), key=lambda item: item[1][0])]
+        for key in self.due:
+            del self.location[key]
+        self.due.clear()
+
+        while True:
+            found = self._next_slot()
+            if found is None or found[0] > target:
+                break
+            self.current, level, slot = found
+            bucket = self.levels[level][slot]
+            self.levels[level][slot] = None
+            self.masks[level] &= ~(1 << slot)
+            for key, (expiry, value) in bucket.items():
+                if expiry == self.current:
+                    del self.location[key]
+                    expired.append((key, value))
+                else:
+                    self._place(key, expiry, value)  # cascade to a lower level
+
+        self.current = max(self.current, target)
+        return expired
+
+
 class ParkingSystem():
+    SNAPSHOT_MAGIC = b"PARKSNP1"
+
     def __init__(self, parking_count_by_size):
         # <each size, deque of ParkingSpot item>
         self.available_parking = {size: deque() for size in Size}
         # <each parked car, parked location>
         self.parked_location = {}
+        # snapshot + delta log, see slot_store
+        self.delta_log = None
+        self.snapshot_generation = 0
+        # time-bounded sessions, timestamps in seconds (time.time() style); car id -> until, saved with snapshots
+        self.expiry_wheel = TimingWheel()
 
         for size, count in parking_count_by_size.items():
             for _ in range(count):
                 self.available_parking[size].append(ParkingSpot(size))
 
-    def assign_car(self, car):
+    def assign_car(self, car, until=None):
+        # until: the session (or reservation) ends then, advance() past it reclaims the spot
         for size in Size:
             if car.get_size().get_num_val() > size.get_num_val():
                 continue
             assigned_parking = self._assign_car_by_size(car, size)
 
             if assigned_parking:
+                if until is not None:
+                    self._start_session(car.get_id(), until)
                 return assigned_parking.get_id()
         return "Reject"
     
+    def advance(self, now):
+        # overstay enforcement: every session that ended by now, as [(car, spot id), ...], spots go back to the pool
+        # O(expired), the active sessions are never scanned
+        expired = []
+        for car_id, _ in self.expiry_wheel.advance(now):
+            spot_id = self.parked_location[car_id].get_id()
+            expired.append((self.get_car(car_id), spot_id))
+        return expired
+
     def get_car(self, car_id):
         if car_id in self.parked_location:
+            self.expiry_wheel.cancel(car_id)
             parking_spot = self.parked_location[car_id]
             retrieved_car = parking_spot.retrieve_car()
             
-            self.available_parking[parking_spot.get_size()].append(parking_spot)
+            self._release_spot(parking_spot)
             del self.parked_location[car_id]
+            if self.delta_log is not None:
+                self.delta_log.log_release(car_id)
 
             return retrieved_car
         return None
@@ -84,14 +217,356 @@ class ParkingSystem():
     def _assign_car_by_size(self, car, size):
         if self.available_parking[size]:
             assigned_parking = self.available_parking[size].popleft()
-            assigned_parking.assign_car(car)
-            self.parked_location[car.get_id()] = assigned_parking
+            self._park(car, assigned_parking)
 
             return assigned_parking
         
         return None
+
+    def _park(self, car, parking_spot):
+        # bookkeeping once a free spot has been picked, shared by every allocator
+        parking_spot.assign_car(car)
+        self.parked_location[car.get_id()] = parking_spot
+        if self.delta_log is not None:
+            self.delta_log.log_assign(parking_spot.get_size().get_num_val(), parking_spot.get_id(),
+                                      car.get_id(), car.get_size().get_num_val())
+
+    def _start_session(self, car_id, until):
+        # until is kept as the wheel value, so save_snapshot can write it back out
+        self.expiry_wheel.schedule(car_id, until, until)
+        if self.delta_log is not None:
+            self.delta_log.log_deadline(car_id, until)
+
+    def _release_spot(self, parking_spot):
+        # give a spot back to the free pool, allocators with their own pool override this
+        self.available_parking[parking_spot.get_size()].append(parking_spot)
+
+    def open_delta_log(self, path, reset=False, sync=False):
+        # every assign/release after the last snapshot goes here, sync=True fsyncs each record
+        if self.delta_log is not None:
+            self.delta_log.close()
+        self.delta_log = DeltaLog(path, self.snapshot_generation, reset, sync)
+
+    def save_snapshot(self, path, delta_log_path=None):
+        sync = self.delta_log is not None and self.delta_log.sync
+        free_ids = [[spot.get_id() for spot in self.available_parking[size]] for size in Size]
+        occupied = [(spot.get_id(), spot.get_size().get_num_val(), car_id, spot.parked.get_size().get_num_val())
+                    for car_id, spot in self.parked_location.items()]
+        self.snapshot_generation = max(self.snapshot_generation + 1, time.time_ns())
+        write_snapshot_file(path, self.SNAPSHOT_MAGIC, self.snapshot_generation, free_ids, occupied,
+                            list(self.expiry_wheel.items()))
+        if delta_log_path is None and self.delta_log is not None:
+            delta_log_path = self.delta_log.path
+        if delta_log_path is not None:
+            self.open_delta_log(delta_log_path, reset=True, sync=sync)
+
+    @classmethod
+    def load_snapshot(cls, path, delta_log_path=None):
+        # spots and cars built in bulk from the snapshot columns, then the delta log is replayed on top
+        # session deadlines go back on the expiry wheel, so advance() enforces them like before the restart
+        generation, free_ids, (spot_ids, spot_sizes, car_ids, car_sizes), deadlines = \
+            read_snapshot_file(path, cls.SNAPSHOT_MAGIC)
+        sizes = list(Size)
+        system = cls({})
+        system.snapshot_generation = generation
+        for size, ids in zip(sizes, free_ids):
+            system.available_parking[size].extend(
+                bulk_new(ParkingSpot, ("id", "size", "parked"), ids, itertools.repeat(size), itertools.repeat(None)))
+
+        cars = bulk_new(Car, ("id", "size"), car_ids, map(sizes.__getitem__, car_sizes))
+        spots = bulk_new(ParkingSpot, ("id", "size", "parked"), spot_ids, map(sizes.__getitem__, spot_sizes), cars)
+        system.parked_location.update(zip(car_ids, spots))
+        deadlines = dict(deadlines)
+
+        if delta_log_path is not None:
+            def new_car(car_id, size):
+                return bulk_new(Car, ("id", "size"), [car_id], [size])[0]
+            replay_deltas(DeltaLog.records(delta_log_path, generation), system.available_parking,
+                          system.parked_location, sizes, new_car, ParkingSpot.assign_car, ParkingSpot.retrieve_car,
+                          deadlines)
+            system.open_delta_log(delta_log_path)
+        for car_id, until in deadlines.items():
+            system.expiry_wheel.schedule(car_id, until, until)
+        return system
         
 
 
 
-        
\ No newline at end of file
+class NearestSpotParkingSystem(ParkingSystem):
+    # multi-level garage: every spot has a position, a car gets the nearest free spot of the smallest fitting size
+    # to the entrance (or elevator) it came in by, bigger sizes are still the fallback like in ParkingSystem
+    # one min-heap of (distance, spot index, version) per (size, entrance): assign pops, release pushes into every
+    # entrance's heap of that size, O(E log n); an entry for a spot that was taken since (version moved on) is
+    # stale and dropped when it reaches the top, heaps are rebuilt when stale entries outnumber the free spots
+    def __init__(self, spots, entrances, distance=None):
+        # spots: [(Size, position), ...], entrances: {name: position}, positions are coordinate tuples such as
+        # (level, x, y); distance defaults to manhattan distance between two positions
+        if not entrances:
+            raise ValueError("NearestSpotParkingSystem needs at least one entrance")
+        super().__init__({})
+        if distance is None:
+            distance = lambda a, b: sum(abs(p - q) for p, q in zip(a, b))
+        self.entrances = list(entrances)
+        self.spots = []
+        self.spot_index = {}  # spot id -> index into spots / versions / distances
+        self.versions = []  # bumped whenever a spot is taken or released
+        self.distances = []  # distances[i][e] from spot i to entrance e
+        self.free_spots = {size: set() for size in Size}  # spot indices, for status and heap rebuilds
+        self.heaps = {(size, e): [] for size in Size for e in range(len(self.entrances))}
+
+        for index, (size, position) in enumerate(spots):
+            spot = ParkingSpot(size)
+            self.spots.append(spot)
+            self.spot_index[spot.get_id()] = index
+            self.versions.append(0)
+            self.distances.append([distance(position, entrances[name]) for name in self.entrances])
+            self.free_spots[size].add(index)
+        for (size, e), heap in self.heaps.items():
+            heap.extend((self.distances[i][e], i, 0) for i in self.free_spots[size])
+            heapq.heapify(heap)
+
+    def assign_car(self, car, until=None, entrance=None):
+        # entrance: name from entrances, the first one if not given
+        e = self.entrances.index(entrance) if entrance is not None else 0
+        for size in Size:
+            if car.get_size().get_num_val() > size.get_num_val():
+                continue
+            spot = self._nearest_free(size, e)
+            if spot is not None:
+                self._park(car, spot)
+                if until is not None:
+                    self._start_session(car.get_id(), until)
+                return spot.get_id()
+        return "Reject"
+
+    def _nearest_free(self, size, e):
+        # O(log n) amortized, stale entries are each popped once
+        heap = self.heaps[(size, e)]
+        versions = self.versions
+        while heap:
+            _, index, version = heapq.heappop(heap)
+            if version == versions[index]:
+                versions[index] += 1  # every other entrance's entry for this spot is stale now
+                self.free_spots[size].discard(index)
+                return self.spots[index]
+        return None
+
+    def _release_spot(self, parking_spot):
+        index = self.spot_index[parking_spot.get_id()]
+        size = parking_spot.get_size()
+        self.versions[index] += 1
+        version = self.versions[index]
+        self.free_spots[size].add(index)
+        for e in range(len(self.entrances)):
+            heap = self.heaps[(size, e)]
+            if len(heap) > 2 * len(self.free_spots[size]) + 64:
+                # mostly stale, rebuild from the free spots at their current versions
+                heap[:] = [(self.distances[i][e], i, self.versions[i]) for i in self.free_spots[size]]
+                heapq.heapify(heap)
+            else:
+                heapq.heappush(heap, (self.distances[index][e], index, version))
+
+    # the snapshot format is the FIFO pool of ParkingSystem, spot positions and heaps are not in it, and a delta log
+    # with no snapshot to replay it onto would only be written, never read, so persistence is off for this allocator
+    def open_delta_log(self, path, reset=False, sync=False):
+        raise TypeError("NearestSpotParkingSystem has no snapshot format, a delta log could not be replayed")
+
+    def save_snapshot(self, path, delta_log_path=None):
+        raise TypeError("NearestSpotParkingSystem has no snapshot format, spot positions and heaps are not saved")
+
+    @classmethod
+    def load_snapshot(cls, path, delta_log_path=None):
+        raise TypeError("NearestSpotParkingSystem has no snapshot format, spot positions and heaps are not saved")
+
+
+# compact mode: spots are indices into array columns, car and spot ids are ints
+_car_ids = itertools.count()
+
+
+class CompactCar():
+    __slots__ = ("id", "size")
+
+    def __init__(self, size):
+        self.id = next(_car_ids)
+        self.size = size
+
+    def get_id(self):
+        return self.id
+
+    def get_size(self):
+        return self.size
+
+
+class CompactParkingSystem():
+    SIZES = tuple(Size)  # size value -> Size
+
+    def __init__(self, parking_count_by_size):
+        # spot i has size spot_sizes[i] and holds parked[i], each size is one contiguous index range
+        total = sum(parking_count_by_size.values())
+        self.spot_sizes = array("b", bytes(total))
+        self.parked = [None] * total
+        self.available_parking = {}  # <Size, IndexQueue of spot indices>
+        self.parked_location = {}  # <car id, spot index>
+
+        start = 0
+        for size in Size:
+            count = parking_count_by_size.get(size, 0)
+            self.spot_sizes[start:start + count] = array("b", [size.get_num_val()]) * count
+            self.available_parking[size] = IndexQueue(count)
+            self.available_parking[size].extend_range(start, start + count)
+            start += count
+
+    def assign_car(self, car):
+        # smallest spot that fits, returns the spot id like ParkingSystem
+        for size in self.SIZES[car.get_size().get_num_val():]:
+            queue = self.available_parking[size]
+            if queue:
+                index = queue.popleft()
+                self.parked[index] = car
+                self.parked_location[car.get_id()] = index
+                return index
+        return "Reject"
+
+    def get_car(self, car_id):
+        index = self.parked_location.pop(car_id, None)
+        if index is None:
+            return None
+        car = self.parked[index]
+        self.parked[index] = None
+        self.available_parking[self.SIZES[self.spot_sizes[index]]].append(index)
+        return car
+
+
+def benchmark_compact(num_spots=300_000, num_cars=100_000):
+    # construction time and memory, object-per-spot ParkingSystem vs CompactParkingSystem
+    counts = {Size.SMALL: num_spots // 2, Size.MEDIUM: num_spots // 3}
+    counts[Size.LARGE] = num_spots - sum(counts.values())
+
+    for system_class, car_class in ((ParkingSystem, Car), (CompactParkingSystem, CompactCar)):
+        start = time.perf_counter()
+        system = system_class(counts)
+        build_time = time.perf_counter() - start
+
+        tracemalloc.start()
+        system = system_class(counts)
+        build_memory = tracemalloc.get_traced_memory()[0]
+        cars = [car_class(Size.MEDIUM) for _ in range(num_cars)]
+        for car in cars:
+            system.assign_car(car)
+        full_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        for car in cars:
+            assert system.get_car(car.get_id()) is car
+        assert {size: len(queue) for size, queue in system.available_parking.items()} == counts
+        print(f"{system_class.__name__}: {num_spots:,} spots built in {build_time:.3f}s, "
+              f"{build_memory / 2**20:.1f} MiB, {full_memory / 2**20:.1f} MiB with {num_cars:,} cars")
+
+
+def benchmark_expiry(num_sessions=300_000, steps=50, step_seconds=60):
+    # overstay checks every minute: scan every session's end time vs ParkingSystem.advance on the timing wheel
+    rng = random.Random(8)
+    counts = {Size.SMALL: num_sessions // 3, Size.MEDIUM: num_sessions // 3}
+    counts[Size.LARGE] = num_sessions - sum(counts.values())
+    cars = [Car(rng.choice(list(Size))) for _ in range(num_sessions)]
+    ends = [rng.uniform(0, 24 * 3600) for _ in range(num_sessions)]  # sessions end over the next day
+
+    system = ParkingSystem(counts)
+    session_end = {}
+    for car, end in zip(cars, ends):
+        system.assign_car(car, until=end)
+        session_end[car.get_id()] = end
+
+    scan_time = wheel_time = 0.0
+    scanned = reclaimed = 0
+    for step in range(1, steps + 1):
+        now = step * step_seconds
+        start = time.perf_counter()
+        overstayed = [car_id for car_id, end in session_end.items() if end <= now]
+        for car_id in overstayed:
+            del session_end[car_id]
+        scan_time += time.perf_counter() - start
+        scanned += len(overstayed)
+
+        start = time.perf_counter()
+        reclaimed += len(system.advance(now))
+        wheel_time += time.perf_counter() - start
+
+    assert scanned == reclaimed
+    print(f"{num_sessions:,} sessions, {steps} checks, {reclaimed:,} expired: "
+          f"scan {scan_time / steps * 1000:.1f}ms/check, timing wheel {wheel_time / steps * 1000:.2f}ms/check")
+
+
+def benchmark_nearest(levels=4, spots_per_level=2_500, num_entrances=4, steps=200_000):
+    # garage simulation: cars arrive at a random entrance and leave at random, arrivals slightly outnumber
+    # departures so the garage runs close to full, where picking the spot matters most
+    # FIFO ParkingSystem vs NearestSpotParkingSystem, throughput and average distance to the car's entrance
+    rng = random.Random(9)
+    sizes = [Size.SMALL] * 5 + [Size.MEDIUM] * 4 + [Size.LARGE]
+    layout = [(rng.choice(sizes), (level * 50, x, y)) for level in range(levels)
+              for x, y in zip(range(spots_per_level), itertools.cycle(range(0, 100, 10)))]
+    entrances = {f"entrance-{e}": (0, rng.randrange(spots_per_level), 0) for e in range(num_entrances)}
+    entrance_names = list(entrances)
+    events = [(rng.random(), rng.choice(sizes), rng.choice(entrance_names), rng.random()) for _ in range(steps)]
+
+    def walk(position, entrance):
+        return sum(abs(p - q) for p, q in zip(position, entrances[entrance]))
+
+    fifo = ParkingSystem({})
+    position_of = {}
+    for size, position in layout:
+        spot = ParkingSpot(size)
+        fifo.available_parking[size].append(spot)
+        position_of[spot.get_id()] = position
+    nearest = NearestSpotParkingSystem(layout, entrances)
+    nearest_position = {spot.get_id(): layout[i][1] for i, spot in enumerate(nearest.spots)}
+
+    for label, system, positions in (("FIFO ParkingSystem", fifo, position_of),
+                                     ("NearestSpotParkingSystem", nearest, nearest_position)):
+        parked = []
+        total_distance = assigned = 0
+        start = time.perf_counter()
+        for arrive, size, entrance, pick in events:
+            if arrive < 0.55 or not parked:
+                car = Car(size)
+                if system is nearest:
+                    spot_id = system.assign_car(car, entrance=entrance)
+                else:
+                    spot_id = system.assign_car(car)
+                if spot_id != "Reject":
+                    parked.append(car.get_id())
+                    total_distance += walk(positions[spot_id], entrance)
+                    assigned += 1
+            else:
+                index = int(pick * len(parked))
+                parked[index], parked[-1] = parked[-1], parked[index]
+                system.get_car(parked.pop())
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26}{steps / elapsed:>10,.0f} ops/s, average distance {total_distance / assigned:,.1f}")
+
+
+if __name__ == "__main__":
+    parking = CompactParkingSystem({Size.SMALL: 1, Size.MEDIUM: 1, Size.LARGE: 1})
+    car = CompactCar(Size.MEDIUM)
+    print(parking.assign_car(car))  # 1, the medium spot
+    print(parking.assign_car(CompactCar(Size.LARGE)))  # 2
+    print(parking.assign_car(CompactCar(Size.LARGE)))  # Reject
+    print(parking.get_car(car.get_id()) is car)  # True
+
+    timed = ParkingSystem({Size.SMALL: 2, Size.MEDIUM: 0, Size.LARGE: 0})
+    short_stay, long_stay = Car(Size.SMALL), Car(Size.SMALL)
+    timed.assign_car(short_stay, until=60)
+    timed.assign_car(long_stay, until=3600)
+    print([car is short_stay for car, _ in timed.advance(120)])  # [True], the first session overstayed
+    print(timed.assign_car(Car(Size.SMALL)) != "Reject")  # True, its spot was reclaimed
+
+    garage = NearestSpotParkingSystem(
+        [(Size.SMALL, (0, 5)), (Size.SMALL, (0, 40)), (Size.MEDIUM, (1, 2)), (Size.LARGE, (0, 1))],
+        {"north": (0, 0), "south": (0, 45)})
+    print(garage.assign_car(Car(Size.SMALL), entrance="south") == garage.spots[1].get_id())  # True
+    print(garage.assign_car(Car(Size.SMALL), entrance="south") == garage.spots[0].get_id())  # True, only one left
+    print(garage.assign_car(Car(Size.SMALL), entrance="north") == garage.spots[2].get_id())  # True, upgraded to medium
+
+    benchmark_compact()
+    benchmark_expiry()
+    benchmark_nearest()
@@ -0,0 +1,254 @@
+"""
+snapshot + delta log + IndexQueue shared by amazon_locker.LockerSystem and parking_lot.ParkingSystem
+
+both systems are slots (lockers / parking spots) in per-size free queues plus an item id -> slot map,
+so they persist the same way: a snapshot of the whole state, then an append-only log of assigns/releases
+
+"""
+import os
+import struct
+from array import array
+
+# a slot is a locker or parking spot, an item the package or car in it, ids are the 36 char uuid4 strings
+# snapshot: header | per size: count + free slot ids in queue order | occupied count + slot ids, slot sizes,
+# item ids, item sizes as four blocks, so restore decodes each block in one go instead of record by record
+# | deadline count + item ids + float64 untils (time-bounded sessions), absent in snapshots written before it
+_SNAPSHOT_HEADER = struct.Struct("<8sQI")  # magic, generation, number of sizes
+_COUNT = struct.Struct("<I")
+_ID_WIDTH = 36
+_DELTA_HEADER = struct.Struct("<8sQ")  # magic, generation of the snapshot the deltas apply to
+_DELTA_MAGIC = b"SLOTDLT1"
+_ASSIGN = struct.Struct(f"<cB{_ID_WIDTH}s{_ID_WIDTH}sB")  # b"A", slot size, slot id, item id, item size
+_RELEASE = struct.Struct(f"<c{_ID_WIDTH}s")  # b"R", item id
+_DEADLINE = struct.Struct(f"<c{_ID_WIDTH}sd")  # b"D", item id, until, logged right after the item's assign
+_RECORDS = {b"A": _ASSIGN, b"R": _RELEASE, b"D": _DEADLINE}
+
+
+def _join_ids(ids):
+    data = "".join(ids).encode("ascii")
+    if len(data) != _ID_WIDTH * len(ids):
+        raise ValueError(f"snapshot ids must be {_ID_WIDTH} character uuid strings")
+    return data
+
+
+def _split_ids(data, offset, count):
+    text = data[offset:offset + _ID_WIDTH * count].decode("ascii")
+    return [text[i:i + _ID_WIDTH] for i in range(0, len(text), _ID_WIDTH)], offset + _ID_WIDTH * count
+
+
+def write_snapshot_file(path, magic, generation, free_ids_by_size, occupied, deadlines=()):
+    # free_ids_by_size: one list of free slot ids per size value, occupied: (slot id, slot size, item id, item size)
+    # deadlines: (item id, until) of the occupied items whose session ends at until
+    # written to a side file and renamed, a crash leaves the previous snapshot intact
+    slot_ids, slot_sizes, item_ids, item_sizes = zip(*occupied) if occupied else ((), (), (), ())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(magic, generation, len(free_ids_by_size)))
+        for ids in free_ids_by_size:
+            f.write(_COUNT.pack(len(ids)))
+            f.write(_join_ids(ids))
+        f.write(_COUNT.pack(len(occupied)))
+        f.write(_join_ids(slot_ids))
+        f.write(bytes(slot_sizes))
+        f.write(_join_ids(item_ids))
+        f.write(bytes(item_sizes))
+        deadline_ids, untils = zip(*deadlines) if deadlines else ((), ())
+        f.write(_COUNT.pack(len(deadline_ids)))
+        f.write(_join_ids(deadline_ids))
+        f.write(array("d", untils).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path, magic):
+    # returns (generation, free ids per size, (slot ids, slot sizes, item ids, item sizes), [(item id, until), ...])
+    with open(path, "rb") as f:
+        data = f.read()
+    file_magic, generation, num_sizes = _SNAPSHOT_HEADER.unpack_from(data, 0)
+    if file_magic != magic:
+        raise ValueError(f"{path} is not a {magic.decode()} snapshot")
+    offset = _SNAPSHOT_HEADER.size
+
+    free_ids_by_size = []
+    for _ in range(num_sizes):
+        count = _COUNT.unpack_from(data, offset)[0]
+        ids, offset = _split_ids(data, offset + _COUNT.size, count)
+        free_ids_by_size.append(ids)
+
+    count = _COUNT.unpack_from(data, offset)[0]
+    slot_ids, offset = _split_ids(data, offset + _COUNT.size, count)
+    slot_sizes, offset = data[offset:offset + count], offset + count
+    item_ids, offset = _split_ids(data, offset, count)
+    item_sizes, offset = data[offset:offset + count], offset + count
+
+    deadlines = []
+    if offset < len(data):
+        count = _COUNT.unpack_from(data, offset)[0]
+        deadline_ids, offset = _split_ids(data, offset + _COUNT.size, count)
+        untils = array("d")
+        untils.frombytes(data[offset:offset + 8 * count])
+        deadlines = list(zip(deadline_ids, untils))
+    return generation, free_ids_by_size, (slot_ids, slot_sizes, item_ids, item_sizes), deadlines
+
+
+def bulk_new(cls, names, *columns):
+    # objects straight from column values, no __init__ (so no uuid4) per object
+    new = cls.__new__
+    objects = []
+    for values in zip(*columns):
+        obj = new(cls)
+        obj.__dict__ = dict(zip(names, values))
+        objects.append(obj)
+    return objects
+
+
+class DeltaLog:
+    # append-only record of every assign/release since the snapshot with the same generation
+    # a log left behind by an older generation (crash between snapshot and log reset) is ignored and reset
+    # every record is flushed as it is written, sync=True also fsyncs it so it survives a power loss, not just a crash
+    def __init__(self, path, generation, reset=False, sync=False):
+        self.path = path
+        self.generation = generation
+        self.sync = sync
+        valid_end = None if reset else self._valid_end(path, generation)
+        if valid_end is None:
+            with open(path, "wb") as f:
+                f.write(_DELTA_HEADER.pack(_DELTA_MAGIC, generation))
+        else:
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)  # drop a torn last record
+        self.file = open(path, "ab")
+
+    @staticmethod
+    def _valid_end(path, generation):
+        # byte offset after the last whole record, None if the file is missing or belongs to another snapshot
+        end = None
+        for end, _ in DeltaLog._scan(path, generation):
+            pass
+        return end
+
+    @staticmethod
+    def _scan(path, generation):
+        # yields (offset after record, record), starting with (header end, None)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < _DELTA_HEADER.size or _DELTA_HEADER.unpack_from(data, 0) != (_DELTA_MAGIC, generation):
+            return
+        offset = _DELTA_HEADER.size
+        yield offset, None
+        while offset < len(data):
+            record_struct = _RECORDS.get(data[offset:offset + 1])
+            if record_struct is None or offset + record_struct.size > len(data):
+                return
+            record = record_struct.unpack_from(data, offset)
+            offset += record_struct.size
+            yield offset, record
+
+    @staticmethod
+    def records(path, generation):
+        # ("A", slot size, slot id, item id, item size) / ("R", item id) / ("D", item id, until) in log order,
+        # ids decoded
+        for _, record in DeltaLog._scan(path, generation):
+            if record is None:
+                continue
+            if record[0] == b"A":
+                yield "A", record[1], record[2].decode("ascii"), record[3].decode("ascii"), record[4]
+            elif record[0] == b"R":
+                yield "R", record[1].decode("ascii")
+            else:
+                yield "D", record[1].decode("ascii"), record[2]
+
+    def log_assign(self, slot_size, slot_id, item_id, item_size):
+        self._append(_ASSIGN.pack(b"A", slot_size, slot_id.encode("ascii"), item_id.encode("ascii"), item_size))
+
+    def log_release(self, item_id):
+        self._append(_RELEASE.pack(b"R", item_id.encode("ascii")))
+
+    def log_deadline(self, item_id, until):
+        self._append(_DEADLINE.pack(b"D", item_id.encode("ascii"), until))
+
+    def _append(self, record):
+        self.file.write(record)
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def replay_deltas(records, free_slots, occupied, sizes, new_item, fill, empty, deadlines=None):
+    # applies DeltaLog.records on top of a restored snapshot, the same pops in the same order as when they were
+    # logged, the recorded slot id double checks that
+    # free_slots: {Size: deque of slots}, occupied: {item id: slot}, sizes: list(Size) of the calling module,
+    # new_item(item id, Size) builds the item, fill(slot, item) / empty(slot) put it in and take it out
+    # deadlines: {item id: until} from the snapshot, kept in step with the log, a released item's deadline is dropped
+    for record in records:
+        if record[0] == "A":
+            _, slot_size, slot_id, item_id, item_size = record
+            slot = free_slots[sizes[slot_size]].popleft()
+            if slot.get_id() != slot_id:
+                raise ValueError(f"delta log expects slot {slot_id}, replay popped {slot.get_id()}")
+            fill(slot, new_item(item_id, sizes[item_size]))
+            occupied[item_id] = slot
+        elif record[0] == "R":
+            slot = occupied.pop(record[1])
+            empty(slot)
+            free_slots[slot.get_size()].append(slot)
+            if deadlines is not None:
+                deadlines.pop(record[1], None)
+        elif deadlines is not None:
+            deadlines[record[1]] = record[2]
+
+
+class IndexQueue:
+    # FIFO of ints in a fixed-capacity array ring buffer, 8 bytes a slot instead of a deque of objects
+    __slots__ = ("items", "head", "length")
+
+    def __init__(self, capacity):
+        self.items = array("q", bytes(8 * capacity))
+        self.head = 0
+        self.length = 0
+
+    def append(self, value):
+        capacity = len(self.items)
+        if self.length == capacity:
+            raise OverflowError("IndexQueue is full")
+        self.items[(self.head + self.length) % capacity] = value
+        self.length += 1
+
+    def popleft(self):
+        if not self.length:
+            raise IndexError("pop from an empty IndexQueue")
+        value = self.items[self.head]
+        self.head = (self.head + 1) % len(self.items)
+        self.length -= 1
+        return value
+
+    def extend_range(self, start, stop):
+        # bulk fill with start..stop-1, used at construction so no python loop runs per locker
+        count = stop - start
+        if count <= 0:
+            return
+        if self.length + count > len(self.items):
+            raise OverflowError("IndexQueue is full")
+        tail = (self.head + self.length) % len(self.items)
+        if tail + count <= len(self.items):
+            self.items[tail:tail + count] = array("q", range(start, stop))
+        else:
+            for value in range(start, stop):
+                self.append(value)
+            return
+        self.length += count
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
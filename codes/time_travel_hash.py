@@ -1,40 +1,404 @@
 import bisect
-from typing import Any, Optional, Dict, List, Tuple
+import random
+import sys
+import threading
 import time
+from array import array
+from collections.abc import ItemsView, Mapping
+from typing import Any, Optional, Dict, Iterable, Iterator, List, Tuple
+
+
+class RetentionPolicy:
+    def __init__(self, max_versions: Optional[int] = None, ttl: Optional[int] = None,
+                 downsample_after: Optional[int] = None, downsample_bucket: Optional[int] = None):
+        # all durations are in timestamp units (ms for the default put() clock), None turns a rule off
+        # max_versions: keep only the newest N versions of each key
+        # ttl: drop versions older than now - ttl
+        # downsample_after + downsample_bucket: versions older than now - downsample_after keep only the
+        #   last version of each downsample_bucket-wide time bucket, so get() at a bucket boundary is unchanged
+        # the newest version of a key is always kept, so get(key, now) never loses the current value
+        if (downsample_after is None) != (downsample_bucket is None):
+            raise ValueError("downsample_after and downsample_bucket must be set together")
+        if max_versions is not None and max_versions < 1:
+            raise ValueError(f"max_versions must be at least 1, got {max_versions}")
+        if ttl is not None and ttl < 0:
+            raise ValueError(f"ttl must not be negative, got {ttl}")
+        if downsample_after is not None and (downsample_after <= 0 or downsample_bucket <= 0):
+            raise ValueError(f"downsample_after and downsample_bucket must be positive, "
+                             f"got {downsample_after} and {downsample_bucket}")
+        self.max_versions = max_versions
+        self.ttl = ttl
+        self.downsample_after = downsample_after
+        self.downsample_bucket = downsample_bucket
+
+    def keep_indices(self, timestamps: array, now: int) -> Optional[List[int]]:
+        # indices of the versions to keep, None when nothing would be dropped
+        n = len(timestamps)
+        lo = 0
+        if self.max_versions is not None:
+            lo = max(lo, n - self.max_versions)
+        if self.ttl is not None:
+            lo = max(lo, min(bisect.bisect_left(timestamps, now - self.ttl), n - 1))
+
+        downsample_end = lo
+        if self.downsample_bucket is not None:
+            downsample_end = max(lo, bisect.bisect_left(timestamps, now - self.downsample_after))
+            downsample_end = min(downsample_end, n - 1)  # the newest version is never merged away
+
+        # within [lo, downsample_end) keep a version only if the next one falls in a later bucket
+        bucket = self.downsample_bucket
+        kept = [i for i in range(lo, downsample_end) if timestamps[i] // bucket != timestamps[i + 1] // bucket]
+        if lo == 0 and len(kept) == downsample_end:
+            return None
+        kept.extend(range(downsample_end, n))
+        return kept
+
+
+class _SnapshotItems(ItemsView):
+    # (key, value) pairs in one pass over the data, instead of ItemsView's iterate-keys-then-look-each-up
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        timestamp = self._mapping._timestamp
+        bisect_right = bisect.bisect_right
+        for key, (timestamps, values) in self._mapping._data.items():
+            insert_pos = bisect_right(timestamps, timestamp)
+            if insert_pos:
+                yield key, values[insert_pos - 1]
+
+
+class _SnapshotView(Mapping):
+    # read-only view of the whole map as of one timestamp, nothing is materialized up front
+    # each lookup is one binary search on the live arrays, so later puts at or before the timestamp show up
+    def __init__(self, data: Dict[str, Tuple[array, List[Any]]], timestamp: int):
+        self._data = data
+        self._timestamp = timestamp
+
+    def __getitem__(self, key: str) -> Any:
+        timestamps, values = self._data[key]  # KeyError for unknown keys
+        insert_pos = bisect.bisect_right(timestamps, self._timestamp)
+        if insert_pos == 0:
+            raise KeyError(key)  # key exists but had no version yet at this time
+        return values[insert_pos - 1]
+
+    def __iter__(self) -> Iterator[str]:
+        # keys whose first version is at or before the snapshot time
+        timestamp = self._timestamp
+        return (key for key, (timestamps, _) in self._data.items() if timestamps and timestamps[0] <= timestamp)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def items(self) -> ItemsView:
+        return _SnapshotItems(self)
 
 
 class TimeTravelHashMap:
-    def __init__(self):
+    def __init__(self, retention: Optional[RetentionPolicy] = None):
         # more compact storage using separate timestamp and value arrays
-        self.data: Dict[str, Tuple[List[int], List[Any]]] = {}  # <key, (timestamps, values)>
-        
+        # timestamps are a flat array('q') of int64, 8 bytes each instead of a pointer + a python int object
+        self.data: Dict[str, Tuple[array, List[Any]]] = {}  # <key, (timestamps, values)>
+
+        # retention runs as incremental compaction: compact_step() handles a bounded batch of keys and
+        # swaps in trimmed arrays, get() never takes a lock, put() and the swap share the write lock
+        self.retention = retention
+        self.write_lock = threading.Lock()
+        self.compaction_stats = {"versions_reclaimed": 0, "bytes_reclaimed": 0}
+        self._compaction_queue: List[str] = []  # keys left in the current compaction round
+        self._compactor: Optional[threading.Thread] = None
+        self._compactor_stop = threading.Event()
+
     def put(self, key: str, value: Any, timestamp: Optional[int] = None) -> None:
         # store using parallel arrays for better memory efficiency
         if timestamp is None:
             timestamp = int(time.time() * 1000)
-            
-        if key not in self.data:
-            self.data[key] = ([], [])  # initialize parallel arrays
-            
-        timestamps, values = self.data[key]
-        
-        # find insertion position and insert into both arrays
-        insert_pos = bisect.bisect_left(timestamps, timestamp)
-        timestamps.insert(insert_pos, timestamp)
-        values.insert(insert_pos, value)
-        
+
+        with self.write_lock:
+            if key not in self.data:
+                self.data[key] = (array('q'), [])  # initialize parallel arrays
+
+            timestamps, values = self.data[key]
+
+            # fast path: writes almost always arrive in timestamp order, so this is an O(1) append
+            if not timestamps or timestamp > timestamps[-1]:
+                timestamps.append(timestamp)
+                values.append(value)
+                return
+
+            # out of order write: find insertion position and insert into both arrays
+            insert_pos = bisect.bisect_left(timestamps, timestamp)
+            timestamps.insert(insert_pos, timestamp)
+            values.insert(insert_pos, value)
+
     def get(self, key: str, timestamp: int) -> Optional[Any]:
         # retrieve using parallel array structure
         if key not in self.data:
             return None
-            
+
         timestamps, values = self.data[key]
-        
+
         # binary search in timestamp array
         insert_pos = bisect.bisect_right(timestamps, timestamp)
-        
+
         if insert_pos == 0:
             return None
-            
+
         # return corresponding value from values array
-        return values[insert_pos - 1]
\ No newline at end of file
+        return values[insert_pos - 1]
+
+    def get_many(self, keys: Iterable[str], timestamp: int) -> List[Optional[Any]]:
+        # get() for a batch of keys at one timestamp, None where get() would return None
+        # same binary searches, minus a python method call and the repeated attribute lookups per key
+        data = self.data
+        bisect_right = bisect.bisect_right
+        results = []
+        for key in keys:
+            entry = data.get(key)
+            if entry is None:
+                results.append(None)
+                continue
+            insert_pos = bisect_right(entry[0], timestamp)
+            results.append(entry[1][insert_pos - 1] if insert_pos else None)
+        return results
+
+    def snapshot(self, timestamp: int) -> Mapping:
+        # lazy read-only mapping of every key to its value as of timestamp
+        return _SnapshotView(self.data, timestamp)
+
+    def _index_range(self, timestamps: array, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        # [lo, hi) slice of the parallel arrays with start <= timestamp <= end, None means unbounded
+        lo = 0 if start is None else bisect.bisect_left(timestamps, start)
+        hi = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+        return lo, max(lo, hi)
+
+    def history(self, key: str, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Tuple[int, Any]]:
+        # lazy (timestamp, value) pairs with start <= timestamp <= end, oldest first
+        # two binary searches, then index straight into the arrays, nothing is copied
+        # don't put() to the same key while iterating, an insert shifts the indices under the iterator
+        if key not in self.data:
+            return iter(())
+
+        timestamps, values = self.data[key]
+        lo, hi = self._index_range(timestamps, start, end)
+        positions = range(lo, hi)
+        return zip(map(timestamps.__getitem__, positions), map(values.__getitem__, positions))
+
+    def latest(self, key: str) -> Optional[Tuple[int, Any]]:
+        # newest (timestamp, value) for key, or None
+        if key not in self.data:
+            return None
+
+        timestamps, values = self.data[key]
+        return timestamps[-1], values[-1]
+
+    def count(self, key: str, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        # number of versions with start <= timestamp <= end, two binary searches
+        if key not in self.data:
+            return 0
+
+        lo, hi = self._index_range(self.data[key][0], start, end)
+        return hi - lo
+
+    def compact_step(self, max_keys: int = 1000, now: Optional[int] = None) -> int:
+        # apply the retention policy to the next max_keys keys, returns versions reclaimed by this step
+        # keys are visited round robin, a new round starts from a fresh key list once the last one is done
+        with self.write_lock:
+            if not self._compaction_queue:
+                self._compaction_queue = list(self.data)
+        return self._compact_keys(max_keys, now)[0]
+
+    def _compact_keys(self, max_keys: int, now: Optional[int]) -> Tuple[int, bool]:
+        # pop up to max_keys keys off the queue, returns (versions reclaimed, queue drained)
+        # queue, data and stats are only touched under write_lock, so compact() and the compactor thread can overlap
+        if now is None:
+            now = int(time.time() * 1000)
+
+        reclaimed = 0
+        for _ in range(max_keys):
+            with self.write_lock:
+                if not self._compaction_queue:
+                    return reclaimed, True
+                key = self._compaction_queue.pop()
+                if self.retention is None or key not in self.data:
+                    continue  # no policy (the queue still drains), or the key moved out since the round started
+                timestamps, values = self.data[key]
+                kept = self.retention.keep_indices(timestamps, now)
+                if kept is None:
+                    continue
+
+                # build trimmed copies and swap the tuple in one assignment, a concurrent get() sees
+                # either the old pair or the new pair, never a half-trimmed one
+                kept_set = set(kept)
+                dropped_bytes = sum(sys.getsizeof(values[i]) for i in range(len(values)) if i not in kept_set)
+                dropped = len(timestamps) - len(kept)
+                self.data[key] = (array('q', map(timestamps.__getitem__, kept)), list(map(values.__getitem__, kept)))
+
+                # timestamp slot + value list slot per version, plus the shallow size of the dropped values
+                reclaimed += dropped
+                self.compaction_stats["versions_reclaimed"] += dropped
+                self.compaction_stats["bytes_reclaimed"] += dropped * (timestamps.itemsize + 8) + dropped_bytes
+        with self.write_lock:
+            return reclaimed, not self._compaction_queue
+
+    def compact(self, now: Optional[int] = None) -> int:
+        # one full synchronous round over every key
+        if self.retention is None:
+            return 0
+        with self.write_lock:
+            self._compaction_queue = list(self.data)
+        reclaimed = 0
+        drained = False
+        while not drained:
+            step, drained = self._compact_keys(1000, now)
+            reclaimed += step
+        return reclaimed
+
+    def start_compactor(self, interval: float = 1.0, keys_per_step: int = 1000) -> None:
+        # background thread running one compact_step every interval seconds until stop_compactor()
+        if self._compactor is not None:
+            return
+        self._compactor_stop.clear()
+
+        def run():
+            while not self._compactor_stop.wait(interval):
+                self.compact_step(keys_per_step)
+
+        self._compactor = threading.Thread(target=run, name="time-travel-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self) -> None:
+        if self._compactor is None:
+            return
+        self._compactor_stop.set()
+        self._compactor.join()
+        self._compactor = None
+
+
+class _ListTimeTravelHashMap:
+    # the previous layout, list of python ints and bisect + insert on every put, kept as the benchmark baseline
+    def __init__(self):
+        self.data: Dict[str, Tuple[List[int], List[Any]]] = {}
+
+    def put(self, key: str, value: Any, timestamp: int) -> None:
+        if key not in self.data:
+            self.data[key] = ([], [])
+        timestamps, values = self.data[key]
+        insert_pos = bisect.bisect_left(timestamps, timestamp)
+        timestamps.insert(insert_pos, timestamp)
+        values.insert(insert_pos, value)
+
+
+def _write_stream(n, num_keys, disorder):
+    # (key, timestamp) pairs, timestamps climb by ~1ms, a `disorder` fraction of writes arrives up to 1s late
+    keys = [f"key-{i}" for i in range(num_keys)]
+    rng = random.Random(42)
+    base = 1_700_000_000_000
+    for i in range(n):
+        timestamp = base + i
+        if disorder and rng.random() < disorder:
+            timestamp -= rng.randint(1, 1000)
+        yield keys[i % num_keys], timestamp
+
+
+def benchmark_put(n=10_000_000, num_keys=1_000):
+    # put throughput and memory per version, ordered and mostly-ordered streams
+    # n versions spread over num_keys keys, the value is a shared object so we only measure the map itself
+    print(f"{'stream':<16}{'layout':<10}{'puts/s':>14}{'bytes/version':>16}")
+    for name, disorder in (("ordered", 0.0), ("mostly-ordered", 0.01)):
+        for layout, cls in (("list", _ListTimeTravelHashMap), ("array", TimeTravelHashMap)):
+            stream = list(_write_stream(n, num_keys, disorder))
+
+            time_map = cls()
+            start = time.perf_counter()
+            for key, timestamp in stream:
+                time_map.put(key, None, timestamp)
+            elapsed = time.perf_counter() - start
+
+            # deep size of the timestamp containers (+ their int objects for lists) and the value lists
+            size = 0
+            for timestamps, values in time_map.data.values():
+                size += sys.getsizeof(timestamps) + sys.getsizeof(values)
+                if isinstance(timestamps, list):
+                    size += sum(sys.getsizeof(t) for t in timestamps)
+            print(f"{name:<16}{layout:<10}{n / elapsed:>14,.0f}{size / n:>16.1f}")
+            del stream, time_map
+
+
+def benchmark_history(num_versions=1_000_000, window=10_000, queries=200):
+    # replaying a time range of one key, point get() per timestamp vs history()
+    time_map = TimeTravelHashMap()
+    for i in range(num_versions):
+        time_map.put("audit", i, i * 10)
+
+    rng = random.Random(7)
+    starts = [rng.randrange(0, (num_versions - window) * 10) for _ in range(queries)]
+
+    start_time = time.perf_counter()
+    for start in starts:
+        # what replay jobs do today: one point lookup per version timestamp they already know about
+        for timestamp in range(start - start % 10 + 10, start + window * 10, 10):
+            time_map.get("audit", timestamp)
+    point = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for start in starts:
+        for _ in time_map.history("audit", start, start + window * 10):
+            pass
+    ranged = time.perf_counter() - start_time
+
+    print(f"{queries} ranges of {window:,} versions: point gets {point:.2f}s, history() {ranged:.2f}s")
+
+
+def benchmark_retention(num_keys=10_000, versions_per_key=200):
+    # memory before/after one compaction round with keep-last-N and downsampling
+    policy = RetentionPolicy(max_versions=100, downsample_after=50_000, downsample_bucket=10_000)
+    time_map = TimeTravelHashMap(retention=policy)
+    for key in range(num_keys):
+        for i in range(versions_per_key):
+            time_map.put(f"key-{key}", f"value-{i}", i * 1000)
+
+    start = time.perf_counter()
+    time_map.compact(now=versions_per_key * 1000)
+    elapsed = time.perf_counter() - start
+    stats = time_map.compaction_stats
+    print(f"compacted {num_keys:,} keys in {elapsed:.2f}s: {stats['versions_reclaimed']:,} versions, "
+          f"{stats['bytes_reclaimed'] / 1e6:.1f} MB reclaimed")
+
+
+def benchmark_snapshot(num_keys=1_000_000, versions_per_key=3):
+    # whole-map state at one time across num_keys keys: get() loop vs get_many vs the snapshot view
+    time_map = TimeTravelHashMap()
+    keys = [f"key-{i}" for i in range(num_keys)]
+    for version in range(versions_per_key):
+        for key in keys:
+            time_map.put(key, version, version * 1000)
+    at = (versions_per_key - 1) * 1000 - 1
+
+    start = time.perf_counter()
+    looped = [time_map.get(key, at) for key in keys]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = time_map.get_many(keys, at)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    view = time_map.snapshot(at)
+    materialized = dict(view.items())
+    view_time = time.perf_counter() - start
+
+    assert looped == batched == [materialized[key] for key in keys]
+    print(f"{num_keys:,} keys: get() loop {loop_time:.2f}s, get_many {batch_time:.2f}s, dict(snapshot) {view_time:.2f}s")
+
+
+if __name__ == "__main__":
+    time_map = TimeTravelHashMap()
+    time_map.put("config", "v1", 100)
+    time_map.put("config", "v3", 300)
+    time_map.put("config", "v2", 200)  # late write takes the bisect path
+    print(time_map.get("config", 50), time_map.get("config", 250), time_map.get("config", 999))
+    print(list(time_map.history("config", 150, 300)), time_map.latest("config"), time_map.count("config", end=200))
+    print(dict(time_map.snapshot(250)), time_map.get_many(["config", "missing"], 250))
+
+    benchmark_put()
+    benchmark_history()
+    benchmark_retention()
+    benchmark_snapshot()
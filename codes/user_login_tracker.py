@@ -70,4 +70,423 @@ class OptimizedLoginTracker:
                 heapq.heappop(self.single_login_heap)
         
         # no single login users found
-        return None
\ No newline at end of file
+        return None
+
+
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+class WindowedLoginTracker:
+    def __init__(self, window):
+        # same question as OptimizedLoginTracker, but only over logins in the last `window` time units
+        # logins must arrive in timestamp order (a live stream), a login at t counts while now - window < t
+        self.window = window
+        self.now = float('-inf')
+        self.events = deque()  # [(timestamp, username), ...] logins inside the window, oldest first
+        # track in-window login count for each user, users with no login in the window are dropped
+        self.user_login_count = {}  # <username, count>
+        # the remaining in-window logins of a user are always its newest ones, so its last login is all we
+        # need to know which login is left once the count drops back to 1
+        self.user_last_login = {}  # <username, (timestamp, seq)>
+        # min heap of single login candidates, seq (arrival order) breaks timestamp ties like LoginTracker does
+        self.single_login_heap = []  # [(timestamp, seq, username), ...]
+        self.seq = 0
+
+    def record_login(self, username, timestamp): # O(log n) if it makes a new single login user, else O(1) amortized
+        if timestamp < self.now:
+            raise ValueError(f"login at {timestamp} is older than the stream time {self.now}")
+        self._evict(timestamp)
+
+        self.seq += 1
+        self.events.append((timestamp, username))
+        self.user_last_login[username] = (timestamp, self.seq)
+        count = self.user_login_count.get(username, 0) + 1
+        self.user_login_count[username] = count
+        if count == 1:
+            heapq.heappush(self.single_login_heap, (timestamp, self.seq, username))
+
+    def _evict(self, now):
+        # slide the window to now, every login is evicted exactly once so this is O(1) amortized
+        self.now = now
+        cutoff = now - self.window
+        events = self.events
+        counts = self.user_login_count
+        heap = self.single_login_heap
+
+        while events and events[0][0] <= cutoff:
+            _, username = events.popleft()
+            count = counts[username] - 1
+            if count == 0:
+                del counts[username]
+                del self.user_last_login[username]
+            else:
+                counts[username] = count
+                if count == 1:
+                    # down to one login again, its newest login becomes a candidate
+                    timestamp, seq = self.user_last_login[username]
+                    heapq.heappush(heap, (timestamp, seq, username))
+
+        # expired candidates are the smallest timestamps, so they sit on top, drop them now to bound memory
+        while heap and heap[0][0] <= cutoff:
+            heapq.heappop(heap)
+
+    def get_earliest_single_login_user(self, now=None): # O1 amortized, stale entries are popped once
+        if now is not None:
+            if now < self.now:
+                raise ValueError(f"query time {now} is older than the stream time {self.now}")
+            self._evict(now)
+
+        heap = self.single_login_heap
+        while heap:
+            timestamp, seq, username = heap[0]
+            # still valid only if the user is at one login and that login is this entry
+            if self.user_login_count.get(username) == 1 and self.user_last_login[username][1] == seq:
+                return username
+            heapq.heappop(heap)
+
+        return None
+
+
+class OrderedLoginTracker:
+    def __init__(self):
+        # same answers as OptimizedLoginTracker without the lazy heap: a user is unlinked the moment it logs in
+        # a second time, so there are no dead entries and every op is O(1) worst case
+        # logins must arrive in timestamp order, first-login order is then timestamp order
+        self.seen_users = set()  # every user that ever logged in, a count is not needed, only "more than one"
+        # insertion-ordered linked structure of users with exactly one login, earliest first
+        # (OrderedDict, not dict: popping from a dict leaves holes that next(iter(...)) has to skip over)
+        self.single_login_users = OrderedDict()  # <username, timestamp>
+        self.last_timestamp = float('-inf')
+
+    def record_login(self, username, timestamp): # O1 worst case
+        if timestamp < self.last_timestamp:
+            raise ValueError(f"login at {timestamp} is older than the last login at {self.last_timestamp}")
+        self.last_timestamp = timestamp
+
+        if username in self.seen_users:
+            # second (or later) login, unlink in O(1), a no-op after the first time
+            self.single_login_users.pop(username, None)
+        else:
+            self.seen_users.add(username)
+            self.single_login_users[username] = timestamp
+
+    def get_earliest_single_login_user(self): # O1 worst case, head of the linked list
+        return next(iter(self.single_login_users), None)
+
+
+class _FrequencyBucket:
+    # all users with the same login count, a node in FrequencyLoginTracker's doubly linked bucket list
+    def __init__(self, count):
+        self.count = count
+        self.users = OrderedDict()  # <username, first login timestamp> in the order they reached this count
+        self.prev = None
+        self.next = None
+
+
+class FrequencyLoginTracker:
+    def __init__(self):
+        # LFU-style layout: users grouped into buckets by login count, buckets linked in increasing count order
+        # a login moves its user one bucket up in O(1), so questions about counts never scan every user
+        # logins must arrive in timestamp order, bucket 1 is then ordered by first login time
+        self.user_login_count = {}  # <username, count>
+        self.buckets = {}  # <count, _FrequencyBucket> only non-empty buckets
+        self.head = _FrequencyBucket(0)  # sentinel, head.next is the lowest count bucket
+        self.last_timestamp = float('-inf')
+
+    def _insert_bucket_after(self, node, count):
+        bucket = _FrequencyBucket(count)
+        bucket.prev = node
+        bucket.next = node.next
+        if node.next is not None:
+            node.next.prev = bucket
+        node.next = bucket
+        self.buckets[count] = bucket
+        return bucket
+
+    def _unlink_bucket(self, bucket):
+        bucket.prev.next = bucket.next
+        if bucket.next is not None:
+            bucket.next.prev = bucket.prev
+        del self.buckets[bucket.count]
+
+    def record_login(self, username, timestamp): # O1
+        if timestamp < self.last_timestamp:
+            raise ValueError(f"login at {timestamp} is older than the last login at {self.last_timestamp}")
+        self.last_timestamp = timestamp
+
+        count = self.user_login_count.get(username, 0)
+        self.user_login_count[username] = count + 1
+
+        # take the user out of its current bucket, the new bucket goes right after it (or after head)
+        if count:
+            current = self.buckets[count]
+            first_login = current.users.pop(username)
+        else:
+            current = self.head
+            first_login = timestamp
+
+        target = current.next
+        if target is None or target.count != count + 1:
+            target = self._insert_bucket_after(current, count + 1)
+        target.users[username] = first_login
+
+        if count and not current.users:
+            self._unlink_bucket(current)
+
+    def get_earliest_single_login_user(self): # O1
+        bucket = self.buckets.get(1)
+        return next(iter(bucket.users)) if bucket else None
+
+    def get_k_earliest_single_login_users(self, k): # Ok
+        bucket = self.buckets.get(1)
+        if bucket is None:
+            return []
+        return list(islice(bucket.users, k))
+
+    def get_users_with_count(self, count): # O(number of users returned)
+        bucket = self.buckets.get(count)
+        return list(bucket.users) if bucket else []
+
+    def get_user_count_with_count(self, count): # O1
+        bucket = self.buckets.get(count)
+        return len(bucket.users) if bucket else 0
+
+    def get_count_histogram(self): # O(number of distinct counts)
+        # <count, number of users> in increasing count order
+        histogram = {}
+        bucket = self.head.next
+        while bucket is not None:
+            histogram[bucket.count] = len(bucket.users)
+            bucket = bucket.next
+        return histogram
+
+# parallel ingest of login log files
+# log lines are "username timestamp" (whitespace or comma separated), files are read in the order given
+# map: every chunk of a file is parsed by a worker and split into per-shard partial trackers
+# reduce: each shard merges its partials and names its earliest single login candidate
+# merge: the global answer is the smallest candidate, ties broken by position in the input, exactly like
+#        LoginTracker, which keeps the first-seen of equally early users
+
+def _parse_timestamp(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _chunk_ranges(paths, chunk_bytes):
+    # split every file into (path, start, end) byte ranges that begin and end on line boundaries
+    ranges = []
+    for path in paths:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            start = 0
+            while start < size:
+                end = min(start + chunk_bytes, size)
+                if end < size:
+                    f.seek(end)
+                    f.readline()  # move the cut to just past the next newline
+                    end = f.tell()
+                ranges.append((path, start, end))
+                start = end
+    return ranges
+
+
+def _map_login_chunk(task):
+    # partial tracker for one chunk, split per shard: <username, (raw timestamp, position) or None>
+    # None means "logged in more than once here", such a user can never be the answer, so its timestamp is dropped
+    # position (chunk index, line number) packed in one int orders logins exactly as a serial reader sees them
+    path, start, end, chunk_index, num_shards = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).replace(b",", b" ").split(b"\n")
+
+    seen = {}
+    missing = seen  # sentinel, no username maps to the dict itself
+    base = chunk_index << 32
+    for line_no, line in enumerate(lines):
+        fields = line.split()
+        if len(fields) < 2:
+            continue  # blank or malformed line
+        username = fields[0]
+        previous = seen.get(username, missing)
+        if previous is missing:
+            seen[username] = (fields[1], base + line_no)
+        elif previous is not None:
+            seen[username] = None
+
+    # shard by a hash that is stable across processes, unlike hash(), once per distinct user not per line
+    shards = [{} for _ in range(num_shards)]
+    for username, first_login in seen.items():
+        shards[zlib.crc32(username) % num_shards][username] = first_login
+    return shards
+
+
+def _reduce_login_shard(partials):
+    # merge one shard's partials (in chunk order), return (timestamp, position, username) of its candidate
+    merged = {}
+    for partial in partials:
+        for username, first_login in partial.items():
+            merged[username] = None if username in merged else first_login
+
+    best = None
+    for username, first_login in merged.items():
+        if first_login is not None:
+            candidate = (_parse_timestamp(first_login[0]), first_login[1], username)
+            if best is None or candidate[:2] < best[:2]:
+                best = candidate
+    if best is None:
+        return None
+    return best[0], best[1], best[2].decode()
+
+
+def ingest_login_logs(paths, num_shards=8, max_workers=None, chunk_bytes=32 * 1024 * 1024):
+    # earliest single login user over all the log files, same answer as feeding every line to LoginTracker
+    ranges = _chunk_ranges(paths, chunk_bytes)
+    tasks = [(path, start, end, chunk_index, num_shards) for chunk_index, (path, start, end) in enumerate(ranges)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        shard_partials = [[] for _ in range(num_shards)]
+        for shards in pool.map(_map_login_chunk, tasks):  # map() yields in chunk order
+            for shard_index, partial in enumerate(shards):
+                if partial:
+                    shard_partials[shard_index].append(partial)
+        candidates = [c for c in pool.map(_reduce_login_shard, shard_partials) if c is not None]
+
+    return min(candidates)[2] if candidates else None
+
+
+def serial_ingest_login_logs(paths):
+    # reference: one LoginTracker, one line at a time
+    tracker = LoginTracker()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                fields = line.replace(",", " ").split()
+                if len(fields) >= 2:
+                    tracker.record_login(fields[0], _parse_timestamp(fields[1]))
+    return tracker.get_earliest_single_login_user()
+
+
+def benchmark_ingest(num_lines=5_000_000, num_files=4, num_users=2_000_000):
+    # synthetic multi-file backfill, timestamps shuffled within files so the answer is not just the first line
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        per_file = num_lines // num_files
+        for file_index in range(num_files):
+            path = os.path.join(tmp_dir, f"logins-{file_index}.log")
+            with open(path, "w") as f:
+                f.writelines(f"user-{int(num_users * rng.random() ** 2)} {rng.randrange(10 ** 9)}\n"
+                             for _ in range(per_file))
+            paths.append(path)
+
+        start = time.perf_counter()
+        serial = serial_ingest_login_logs(paths)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel = ingest_login_logs(paths, chunk_bytes=8 * 1024 * 1024)
+        parallel_time = time.perf_counter() - start
+
+    assert serial == parallel, (serial, parallel)
+    print(f"{num_lines:,} lines: serial LoginTracker {serial_time:.1f}s, "
+          f"parallel ingest {parallel_time:.1f}s on {os.cpu_count()} cpus, both -> {parallel}")
+
+
+def benchmark_single_login_trackers(num_users=1_000_000):
+    # adversarial ordering for the lazy heap: every user logs in once, then every user logs in again,
+    # then one query has to pop all num_users dead heap entries before it can answer
+    names = [f"user-{i}" for i in range(num_users)]
+    stream = [(name, i) for i, name in enumerate(names)] + [(name, num_users + i) for i, name in enumerate(names)]
+    clock = time.perf_counter_ns
+
+    print(f"{'tracker':<24}{'peak MB':>10}{'p99 op us':>12}{'max op us':>12}{'final query us':>16}")
+    for cls in (OptimizedLoginTracker, OrderedLoginTracker):
+        tracemalloc.start()
+        tracker = cls()
+        for username, timestamp in stream:
+            tracker.record_login(username, timestamp)
+        tracker.get_earliest_single_login_user()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # latency pass: a query after every 1000th login, plus the final query
+        # gc off so collector pauses over millions of live tuples don't hide the data structure's own tail
+        gc.disable()
+        tracker = cls()
+        latencies = []
+        for i, (username, timestamp) in enumerate(stream):
+            start = clock()
+            tracker.record_login(username, timestamp)
+            if i % 1000 == 0:
+                tracker.get_earliest_single_login_user()
+            latencies.append(clock() - start)
+        start = clock()
+        tracker.get_earliest_single_login_user()
+        final_query = clock() - start
+        gc.enable()
+
+        # max op is mostly dict/set growth, which both trackers pay; the final query is where the dead heap
+        # entries show up
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] / 1000
+        print(f"{cls.__name__:<24}{peak / 1e6:>10.1f}{p99:>12.2f}{latencies[-1] / 1000:>12.1f}{final_query / 1000:>16.1f}")
+
+
+def benchmark_windowed(num_events=100_000_000, num_users=1_000_000, window=60_000, query_every=100, chunk=1_000_000):
+    # synthetic stream, 1 login per time unit, skewed users (a few heavy hitters, a long tail of one-off logins)
+    # generated in chunks outside the timer, tracked state stays bounded by the window however long the stream runs
+    rng = random.Random(42)
+    names = [f"user-{i}" for i in range(num_users)]
+    tracker = WindowedLoginTracker(window)
+    max_state = 0
+    elapsed = 0.0
+    for chunk_start in range(0, num_events, chunk):
+        batch = [names[int(num_users * rng.random() ** 3)] for _ in range(min(chunk, num_events - chunk_start))]
+
+        start = time.perf_counter()
+        for offset, username in enumerate(batch):
+            timestamp = chunk_start + offset
+            tracker.record_login(username, timestamp)
+            if timestamp % query_every == 0:
+                tracker.get_earliest_single_login_user()
+        elapsed += time.perf_counter() - start
+        max_state = max(max_state, len(tracker.events) + len(tracker.single_login_heap))
+
+    print(f"{num_events:,} events in {elapsed:.1f}s ({num_events / elapsed:,.0f}/s), "
+          f"max tracked entries {max_state:,} for a {window:,} wide window")
+
+
+if __name__ == "__main__":
+    tracker = WindowedLoginTracker(window=10)
+    for username, timestamp in [("alice", 1), ("bob", 2), ("alice", 3), ("carol", 5), ("bob", 9)]:
+        tracker.record_login(username, timestamp)
+    print(tracker.get_earliest_single_login_user())  # alice and bob have two logins each -> carol
+    print(tracker.get_earliest_single_login_user(now=12))  # alice@1, bob@2 expire, alice is down to @3 -> alice
+
+    ordered = OrderedLoginTracker()
+    for username, timestamp in [("alice", 1), ("bob", 2), ("alice", 3), ("carol", 4)]:
+        ordered.record_login(username, timestamp)
+    print(ordered.get_earliest_single_login_user())  # alice logged in twice -> bob
+
+    frequency = FrequencyLoginTracker()
+    for username, timestamp in [("alice", 1), ("bob", 2), ("alice", 3), ("carol", 4), ("dave", 5), ("bob", 6)]:
+        frequency.record_login(username, timestamp)
+    print(frequency.get_k_earliest_single_login_users(2), frequency.get_users_with_count(2),
+          frequency.get_count_histogram())  # ['carol', 'dave'] ['alice', 'bob'] {1: 2, 2: 2}
+
+    # the full-scale benchmarks take minutes (100M windowed events), so they only run when asked for
+    if "--benchmark" in sys.argv[1:]:
+        benchmark_ingest()
+        benchmark_single_login_trackers()
+        benchmark_windowed()